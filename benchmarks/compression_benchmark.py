@@ -0,0 +1,81 @@
+"""Bytes on disk vs CPU time for each DB file format, plain and compressed.
+Run from the project root:
+python3 -m benchmarks.compression_benchmark [--movies 50000]
+
+A synthetic DB shaped like the real ones (same poster URL prefix, mostly
+empty notes) is written and then fully read back through the storages, so
+the numbers include the (de)compression as well as the parsing."""
+
+import os
+import time
+import random
+import string
+import argparse
+import tempfile
+from storage.movie import Movie
+from storage.storage_factory import get_storage
+from storage.compression import COMPRESSION_EXTS
+
+POSTER_PREFIX = "https://image.tmdb.org/t/p/w500/"
+FORMATS = ('.json', '.csv')
+
+
+def make_records(count: int, seed=0):
+    """Return 'count' (title, Movie) pairs of random but realistic data."""
+    rng = random.Random(seed)
+    records = []
+    for i in range(count):
+        title = f"{rng.choice(('The ', 'A ', ''))}Movie {i}"
+        poster = (POSTER_PREFIX
+                  + ''.join(rng.choices(string.ascii_letters, k=27)) + '.jpg')
+        notes = rng.choice(('', '', '', 'rewatch', 'The good one!'))
+        records.append((title, Movie(rng.randint(1900, 2024),
+                                     round(rng.uniform(0, 10), 1),
+                                     poster, notes)))
+    return records
+
+
+def time_it(func):
+    """Return (func's result, CPU seconds, wall seconds)."""
+    cpu_start, wall_start = time.process_time(), time.perf_counter()
+    result = func()
+    return (result, time.process_time() - cpu_start,
+            time.perf_counter() - wall_start)
+
+
+def run_benchmark(movie_count: int):
+    """Print one table row per format and compression combination."""
+    records = make_records(movie_count)
+    print(f"{movie_count} movies")
+    print(f"{'file':<16}{'bytes':>12}{'ratio':>8}"
+          f"{'write cpu s':>13}{'read cpu s':>12}{'read wall s':>13}")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for fmt in FORMATS:
+            plain_size = None
+            for ext in ('',) + COMPRESSION_EXTS:
+                file_name = 'bench' + fmt + ext
+                storage = get_storage(os.path.join(tmp_dir, file_name))
+                _, write_cpu, _ = time_it(
+                    lambda: storage.write_movies(records))
+                _, read_cpu, read_wall = time_it(
+                    lambda: sum(1 for _ in storage.iter_movies()))
+                size = os.path.getsize(storage.file_path)
+                if plain_size is None:
+                    plain_size = size
+                print(f"{file_name:<16}{size:>12}{plain_size / size:>8.1f}"
+                      f"{write_cpu:>13.3f}{read_cpu:>12.3f}"
+                      f"{read_wall:>13.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog='python3 -m benchmarks.compression_benchmark',
+        description='MovieApp: compressed storage trade-offs')
+    parser.add_argument("--movies", type=int, default=50000,
+                        help="number of synthetic movies in the DB")
+    args = parser.parse_args()
+    run_benchmark(args.movies)
+
+
+if __name__ == "__main__":
+    main()
@@ -20,55 +20,98 @@ Thanks for reading!
 
 import os
 import argparse
-from storage.storage_json import StorageJson
-from storage.storage_csv import StorageCsv
-from movie_app import MovieApp
+from storage.storage_factory import get_storage
+from storage.compression import COMPRESSION_EXTS, strip_compression_ext
+from movie_app import MovieApp, SORT_CRITERIA, DEFAULT_HISTOGRAM_NAME
+from utils.parallel_fuzzy import DEFAULT_WORKERS, PARALLEL_MIN_TITLES
 
 DATA_SUBDIR = "data"
-CLI_HELP_MSG = "work on a movie db specified by <filename>"
+CLI_HELP_MSG = ("work on a movie db specified by <filename>, "
+                "or on a sharded one if given <dirname>/")
+WATCH_HELP_MSG = ("don't open the menu, regenerate the webpage and the "
+                  "histogram whenever the db changes")
 
 
-def obtain_db_filepath():
-    """Guides user through error message and help hint interaction towards
-    specifying a DB filename. If path not extant, starts a new database."""
+def parse_cli_args():
+    """The DB filename, plus the options of non-interactive watch mode."""
     parser = argparse.ArgumentParser(prog='main.py',
                                      description='MovieApp: DB manipulation')
     parser.add_argument("filename", help=CLI_HELP_MSG)
-    args = parser.parse_args()
-    if not args.filename:
+    parser.add_argument("--watch", action="store_true", help=WATCH_HELP_MSG)
+    parser.add_argument("--sort", choices=list(SORT_CRITERIA.values()),
+                        default=SORT_CRITERIA[0],
+                        help="webpage sorting in watch mode")
+    parser.add_argument("--histogram", default=DEFAULT_HISTOGRAM_NAME,
+                        help="histogram filename (no ext) in watch mode")
+    parser.add_argument("--fuzzy-workers", type=int, default=DEFAULT_WORKERS,
+                        help="processes for fuzzy search, 1 means serial")
+    parser.add_argument("--parallel-min-titles", type=int,
+                        default=PARALLEL_MIN_TITLES,
+                        help="smaller dbs always get searched serially")
+    return parser.parse_args()
+
+
+def obtain_db_filepath(filename: str):
+    """Guides user through error message and help hint interaction towards
+    specifying a DB filename. If path not extant, starts a new database."""
+    if not filename:
         raise ValueError("Filename can't be an empty string.")
-    if '.' not in args.filename:  # then default to .json
-        data_file_path = os.path.join(DATA_SUBDIR, args.filename + '.json')
+    if (filename.endswith(('/', os.sep))
+            or os.path.isdir(os.path.join(DATA_SUBDIR, filename))):
+        return obtain_db_dirpath(filename)
+    if '.' not in filename:  # then default to .json
+        data_file_path = os.path.join(DATA_SUBDIR, filename + '.json')
     else:
-        if args.filename[-5:] != ".json" and args.filename[-4:] != ".csv":
-            raise TypeError("Bad extension, must be .json or .csv or no ext")
-        if ((args.filename[-5:] == ".json" and len(args.filename) < 6)
-                or (len(args.filename) < 5)):
+        base_name = strip_compression_ext(filename)
+        if base_name[-5:] != ".json" and base_name[-4:] != ".csv":
+            raise TypeError("Bad extension, must be .json or .csv (each "
+                            f"optionally + {', '.join(COMPRESSION_EXTS)}) "
+                            "or no ext")
+        if ((base_name[-5:] == ".json" and len(base_name) < 6)
+                or (len(base_name) < 5)):
             raise ValueError("No <filename> found, ext only doesn't suffice")
-        data_file_path = os.path.join(DATA_SUBDIR, args.filename)
+        data_file_path = os.path.join(DATA_SUBDIR, filename)
     if not os.path.exists(data_file_path):
         fd = os.open(data_file_path, os.O_CREAT)
         os.close(fd)
-        print(f"<{args.filename}> not found, starting a new database...")
+        print(f"<{filename}> not found, starting a new database...")
     else:
         print(f"Starting MovieApp at ./{data_file_path}")
     return data_file_path
 
 
+def obtain_db_dirpath(dirname: str):
+    """Sharded DB: a directory of shard files. If not extant, creates it."""
+    dirname = dirname.rstrip('/' + os.sep)
+    if not dirname:
+        raise ValueError("No <dirname> found, a separator only doesn't do")
+    data_dir_path = os.path.join(DATA_SUBDIR, dirname)
+    if not os.path.exists(data_dir_path):
+        os.mkdir(data_dir_path)
+        print(f"<{dirname}> not found, starting a new sharded database...")
+    else:
+        print(f"Starting MovieApp at ./{data_dir_path} (sharded)")
+    return data_dir_path
+
+
 def main():
-    """Expects CL argument specifying a DB filename, creates either a
-    StorageJson or StorageCsv object, then runs MovieApp for it."""
+    """Expects CL argument specifying a DB filename or directory, creates
+    a StorageJson, StorageCsv or StorageSharded object, then runs MovieApp
+    for it, either interactively or in watch mode."""
+    args = parse_cli_args()
     try:
-        db_filepath = obtain_db_filepath()
+        db_filepath = obtain_db_filepath(args.filename)
+        storage = get_storage(db_filepath)
     except Exception as e:  # the general Exception made sense because exiting
         print(f"Error: {e}")
         exit(1)
-    if db_filepath[-5:] == ".json":
-        storage = StorageJson(db_filepath)
+    movie_app = MovieApp(storage, args.fuzzy_workers,
+                         args.parallel_min_titles)
+    if args.watch:
+        sort_choice = list(SORT_CRITERIA.values()).index(args.sort)
+        movie_app.watch(sort_choice, args.histogram)
     else:
-        storage = StorageCsv(db_filepath)
-    movie_app = MovieApp(storage)
-    movie_app.run()
+        movie_app.run()
 
 
 if __name__ == "__main__":
@@ -1,14 +1,19 @@
 import sys
 import os
-import random
 import matplotlib.pyplot as plt
-from storage.storage_json import StorageJson
-from storage.storage_csv import StorageCsv
+from storage.istorage import IStorage
+from storage.movie import Movie, MovieCollection
 from utils.data_fetcher import fetch_data
-from utils.fuzzy_string_matching import get_fuzzy_srch_candidates
+from utils.ranked_search import get_ranked_candidates
+from utils.sampling import MovieSampler
+from utils.fulltext_index import NotesIndex, db_fingerprint, index_path_for
+from utils.db_watcher import DbWatcher
+from utils.query import compile_query, IndexedCollection
+from utils.parallel_fuzzy import (ParallelFuzzyMatcher, should_parallelize,
+                                  DEFAULT_WORKERS, PARALLEL_MIN_TITLES)
 from utils.utils import Utility
 
-MATCH_COEFFICIENT = 0.7
+SEARCH_TOP_K = 10
 FAKE_INT_MAX = 2147483648
 HTML_TEMPL = os.path.join('templates', 'index_template.html')
 HTML_INDEX = 'index.html'
@@ -35,7 +40,27 @@ Menu:
 10. Filter movies
 11. Create ratings histogram
 12. Generate webpage
+13. Search notes
+14. Query movies
 """
+RANDOM_MENU = """
+0. any movie
+1. weighted by rating
+2. matching a filter
+3. several, without repeats
+"""
+RANDOM_MENU_LEN = 4
+SORT_CRITERIA = {
+    0: 'unsorted',
+    1: 'rating',
+    2: 'year',
+    3: 'alphabetically'
+}
+DEFAULT_HISTOGRAM_NAME = 'histogram_default_name'
+QUERY_HELP = """Enter a query, fields: title, notes, year, rating. Examples:
+rating>=7.5 and year in 1990..1999 order by rating desc limit 20
+title~"die" or notes~"rewatch" order by year
+(~ means 'contains', an empty query lists all)"""
 SORTING_MENU = """
 0. not at all
 1. by rating
@@ -46,10 +71,18 @@ SORTING_MENU = """
 
 class MovieApp:
     """User interface for a movie DB with CRUD and more."""
-    def __init__(self, storage: (StorageJson, StorageCsv)):
-        if not isinstance(storage, (StorageJson, StorageCsv)):
+    def __init__(self, storage: IStorage, fuzzy_workers=DEFAULT_WORKERS,
+                 parallel_min_titles=PARALLEL_MIN_TITLES):
+        if not isinstance(storage, IStorage):
             raise TypeError("Error: Can't init MovieApp w/o valid type")
         self._storage = storage
+        self._fuzzy_workers = fuzzy_workers
+        self._parallel_min_titles = parallel_min_titles
+        self._notes_index = None  # loaded on first use, see _get_notes_index
+        self._movies_cache = None  # (DB fingerprint, MovieCollection)
+        self._movie_sampler = None  # built from the cached collection
+        self._indexed_movies = None  # IndexedCollection, likewise
+        self._fuzzy_matcher = None  # ParallelFuzzyMatcher, likewise
 
     def _command_exit_program(self):
         """Has 'self' to fit the function dispatcher syntax.
@@ -65,7 +98,7 @@ class MovieApp:
             return
         print(f"{len(movies)} movies in total:")
         for i, (k, v) in enumerate(movies.items()):
-            print(f"  {i + 1}. <{k}> ({v['year']}), rating: {v['rating']}")
+            print(f"  {i + 1}. <{k}> ({v.year}), rating: {v.rating}")
 
     def _command_add_movie(self):
         """Rely on fetching from an API to add entry to storage"""
@@ -78,7 +111,12 @@ class MovieApp:
         if data is None:
             return
         title, year, rating, poster = data
-        self._storage.add_movie(title, year, rating, poster)
+        notes_index = self._fresh_notes_index()
+        if not self._storage.add_movie(title, year, rating, poster):
+            return
+        if notes_index is not None:
+            notes_index.set_document(title, '')
+            self._save_notes_index(notes_index)
 
     def _command_delete_movie(self):
         """Remove entry from storage. To minimize the iterations of data
@@ -89,7 +127,12 @@ class MovieApp:
         exact_title = self._obtain_match_for_action('delete')
         if not exact_title:
             return
-        self._storage.delete_movie(exact_title)
+        notes_index = self._fresh_notes_index()
+        if not self._storage.delete_movie(exact_title):
+            return
+        if notes_index is not None:
+            notes_index.remove_document(exact_title)
+            self._save_notes_index(notes_index)
         print(f"Movie <{exact_title}> successfully deleted!")
 
     def _command_update_movie(self):
@@ -101,7 +144,13 @@ class MovieApp:
         exact_title = self._obtain_match_for_action('update')
         if not exact_title:
             return
-        self._storage.update_movie(exact_title)
+        notes_index = self._fresh_notes_index()
+        notes = self._storage.update_movie(exact_title)
+        if notes is None:
+            return
+        if notes_index is not None:
+            notes_index.set_document(exact_title, notes)
+            self._save_notes_index(notes_index)
         print(f"Movie <{exact_title}> successfully updated")
 
     def _command_movie_stats(self):
@@ -112,36 +161,93 @@ class MovieApp:
         mov_count = len(movies)
         midpoint = mov_count // 2
         sorted_titles = sorted(movies, key=lambda movie:
-                               (movies[movie]['rating'], movie), reverse=True)
+                               (movies[movie].rating, movie), reverse=True)
         sum_of_ratings = 0
         for value in movies.values():
-            sum_of_ratings += value['rating']
+            sum_of_ratings += value.rating
         if mov_count % 2 == 0:
             median_rating = (
-                (movies.get(sorted_titles[midpoint])['rating'] +
-                 movies.get(sorted_titles[midpoint - 1])['rating']) / 2
+                (movies[sorted_titles[midpoint]].rating +
+                 movies[sorted_titles[midpoint - 1]].rating) / 2
                 )
         else:
-            median_rating = movies.get(sorted_titles[midpoint])['rating']
+            median_rating = movies[sorted_titles[midpoint]].rating
         print(f"Average rating: {round(sum_of_ratings / mov_count, 1)}")
         print(f"Median rating: {round(median_rating, 1)}")
         print(f"Best movie: <{sorted_titles[0]}>, "
-              f"{movies.get(sorted_titles[0])['rating']}")
+              f"{movies[sorted_titles[0]].rating}")
         print(f"Worst movie: <{sorted_titles[-1]}>, "
-              f"{movies.get(sorted_titles[-1])['rating']}")
+              f"{movies[sorted_titles[-1]].rating}")
 
     def _command_random_movie(self):
-        """Print random movie"""
-        movies = self._storage.list_movies()
+        """Print random movie(s), picked in the way the user chooses.
+        The sampler is reused while the DB is unchanged, so repeated picks
+        neither reload the DB nor rebuild the weighted pick's alias table."""
+        print("Which kind of random pick would you like?")
+        while True:
+            usr_choice = Utility.get_user_num_choice(RANDOM_MENU,
+                                                     RANDOM_MENU_LEN)
+            if usr_choice >= 0:
+                break
+        sampler = self._get_movie_sampler()
+        movies = sampler.movies
         if Utility.is_db_empty(movies):
             return
-        db_len = len(movies)
-        random_idx = random.randrange(0, db_len)
-        for i, (k, v) in enumerate(movies.items()):
-            if i == random_idx:
-                print(f"Your movie for tonight: <{k}>, "
-                      f"it's rated {v['rating']}")
-                break
+        if usr_choice == 0:
+            k = sampler.pick()
+            print(f"Your movie for tonight: <{k}>, "
+                  f"it's rated {movies[k].rating}")
+            return
+        if usr_choice == 1:
+            titles = [sampler.pick_weighted()]
+        elif usr_choice == 2:
+            min_rt, start_yr, end_yr = self._obtain_filter_values()
+            titles = [sampler.pick_filtered(
+                lambda mov: self._is_filter_match(mov, min_rt,
+                                                  start_yr, end_yr))]
+            if titles[0] is None:
+                print("No movie matches your filter criteria.")
+                return
+        else:
+            while True:
+                try:
+                    count = int(input("How many movies? "))
+                    if count > 0:
+                        break
+                    print("Error: that's not a positive number.")
+                except ValueError:
+                    print("Error: number of movies must be integer.")
+            titles = sampler.sample(count)
+        print("Your movie(s) for tonight:")
+        for k in titles:
+            print(f"  <{k}>, it's rated {movies[k].rating}")
+
+    def _cached_movies(self):
+        """The DB as one MovieCollection, reloaded only once the DB file
+        changed. Whatever is derived from it gets dropped along with it,
+        so there is never more than one copy of the DB kept around."""
+        fingerprint = db_fingerprint(self._storage.file_path)
+        if (self._movies_cache is None
+                or self._movies_cache[0] != fingerprint):
+            self._drop_cached_movies()
+            self._movies_cache = (fingerprint, self._storage.list_movies())
+        return self._movies_cache[1]
+
+    def _drop_cached_movies(self):
+        """Forget the cached collection and everything built from it."""
+        self._movies_cache = None
+        self._movie_sampler = None
+        self._indexed_movies = None
+        if self._fuzzy_matcher is not None:
+            self._fuzzy_matcher.close()
+            self._fuzzy_matcher = None
+
+    def _get_movie_sampler(self):
+        """The MovieSampler of the cached collection, see _cached_movies()."""
+        movies = self._cached_movies()
+        if self._movie_sampler is None:
+            self._movie_sampler = MovieSampler(movies)
+        return self._movie_sampler
 
     def _command_search_movie(self):
         """Prompt for query, print matches or match candidates."""
@@ -153,18 +259,18 @@ class MovieApp:
         print(f"\nThis is what I've found for <{query}>:")
         for i, mov in enumerate(candidates):
             k, v = next(iter(mov.items()))
-            print(f"  {i + 1}. <{k}> ({v['year']}), rating: {v['rating']}")
+            print(f"  {i + 1}. <{k}> ({v.year}), rating: {v.rating}")
 
     @staticmethod
-    def _print_after_sorting_by(criterion: str, movies: dict):
+    def _print_after_sorting_by(criterion: str, movies: MovieCollection):
         """Sorts movies according to 'criterion', then prints sorted.
         An abstracted utility function for two similarly working functions."""
         sorted_titles = sorted(
             movies, key=lambda movie:
-            (movies[movie][criterion], movie), reverse=True
+            (getattr(movies[movie], criterion), movie), reverse=True
         )
         for mov in sorted_titles:
-            print(f"  <{mov}>: {movies[mov][criterion]}")
+            print(f"  <{mov}>: {getattr(movies[mov], criterion)}")
 
     def _command_movies_sorted_by_rating(self):
         """Reverse sort the movies in storage by rating and print them."""
@@ -199,13 +305,11 @@ class MovieApp:
             return value
         return value  # so it doesn't return None when just passing through
 
-    def _command_filter_movies(self):
-        """Only print the movies which match the filter criteria.
+    def _obtain_filter_values(self):
+        """Prompt for (min_rating, start_year, end_year) of a filter.
         The initialization to -1 facilitates repeat prompting only for those
         values which have not yet been accepted from user input as the loop
         keeps going defensively. Input of '' voids the filter."""
-        movies = self._storage.list_movies()
-        found_a_match = False
         min_rt = -1.0  # the value which signifies "not set yet"
         start_yr = -1
         end_yr = -1
@@ -220,33 +324,78 @@ class MovieApp:
                 end_yr = self._init_flt_val(end_yr, 'end year', int)
                 if isinstance(end_yr, int) and end_yr < 0:  # bad
                     raise ValueError("End year can't be negative")
-                break
+                return min_rt, start_yr, end_yr
             except ValueError as e:
                 print(f"Error: {e}")
+
+    @staticmethod
+    def _is_filter_match(movie: Movie, min_rt: float, start_yr: int,
+                         end_yr: int):
+        """The one filter rule, shared by filter_movies and random_movie."""
+        return movie.rating >= min_rt and start_yr <= movie.year <= end_yr
+
+    def _command_filter_movies(self):
+        """Only print the movies which match the filter criteria."""
+        movies = self._storage.list_movies()
+        found_a_match = False
+        min_rt, start_yr, end_yr = self._obtain_filter_values()
         print("****The following movies match your filter criteria:")
         for k, v in movies.items():
-            if (v['rating'] >= min_rt and
-               start_yr <= v['year'] <= end_yr):
-                print(f"  <{k}> ({v['year']}), rating: {v['rating']}")
+            if self._is_filter_match(v, min_rt, start_yr, end_yr):
+                print(f"  <{k}> ({v.year}), rating: {v.rating}")
                 found_a_match = True
         if not found_a_match:
             print("  <None>")
 
+    def _command_query_movies(self):
+        """Filter and sort with a one-line query (see utils/query), e.g.
+        rating>=7.5 and year in 1990..1999 order by rating desc limit 20"""
+        print(QUERY_HELP)
+        while True:
+            try:
+                plan = compile_query(input("> "))
+                break
+            except ValueError as e:
+                print(f"Error: {e}")
+        matches = plan.execute(self._get_indexed_movies())
+        print("****The following movies match your query:")
+        for k, v in matches:
+            print(f"  <{k}> ({v.year}), rating: {v.rating}")
+        if not matches:
+            print("  <None>")
+
+    def _get_indexed_movies(self):
+        """The cached collection with its sorted indexes, reused for as long
+        as the DB file stays unchanged so that repeated queries skip loading
+        and sorting. See _cached_movies()."""
+        movies = self._cached_movies()
+        if self._indexed_movies is None:
+            self._indexed_movies = IndexedCollection(movies)
+        return self._indexed_movies
+
     def _command_create_ratings_histogram(self):
-        """Drop a file to subdir 'data' with a matplotlib-made histogram"""
+        """Drop a file to subdir 'static' with a matplotlib-made histogram"""
         movies = self._storage.list_movies()
-        ratings = list(rat.get('rating') for rat in movies.values())
+        filename = input("Enter filename for the histogram: ").strip()
+        if '.' in filename:  # prevent user-defined extensions
+            filename = filename[:filename.index('.')]
+        if not filename:
+            filename = DEFAULT_HISTOGRAM_NAME
+        self._save_ratings_histogram(movies, filename)
+
+    @staticmethod
+    def _save_ratings_histogram(movies: MovieCollection, filename: str):
+        """Non-interactive half of create_ratings_histogram, also used by
+        watch mode. Clears the figure first, else repeated calls would pile
+        up their bars on the same histogram."""
+        ratings = list(mov.rating for mov in movies.values())
+        plt.clf()
         plt.hist(ratings, bins=20, range=(0, 10),
                  edgecolor='black', color='gold')
         plt.xlim(0, 10)
         plt.title('Ratings Histogram')
         plt.xlabel('Ratings')
         plt.ylabel('Number of movies')
-        filename = input("Enter filename for the histogram: ").strip()
-        if '.' in filename:  # prevent user-defined extensions
-            filename = filename[:filename.index('.')]
-        if not filename:
-            filename = 'histogram_default_name'
         filename = os.path.join('static', filename + '.png')
         plt.savefig(filename)
         print(f"Histogram successfully created at {filename}")
@@ -255,39 +404,38 @@ class MovieApp:
         """Use ./data/<file> to generate a webpage according to a template.
         Concat the html list elements according to user sorting criteria."""
         movies = self._storage.list_movies()
-        criteria = {
-            0: 'unsorted',
-            1: 'rating',
-            2: 'year',
-            3: 'alphabetically'
-        }
-        menu_len = len(criteria)
+        menu_len = len(SORT_CRITERIA)
         print("How would you like the movies to be sorted on the webpage?")
         while True:
             usr_choice = Utility.get_user_num_choice(SORTING_MENU, menu_len)
             if usr_choice < 0:
                 continue
             break
+        self._write_webpage(movies, usr_choice)
+
+    @staticmethod
+    def _write_webpage(movies: MovieCollection, usr_choice: int):
+        """Non-interactive half of generate_webpage, also used by watch
+        mode. 'usr_choice' is a key of SORT_CRITERIA."""
         if 1 <= usr_choice <= 2:
-            movies = {k: v for k, v in sorted(
+            movies = MovieCollection(sorted(
                 movies.items(), key=lambda movie:
-                movie[1][criteria[usr_choice]], reverse=True)
-            }
+                getattr(movie[1], SORT_CRITERIA[usr_choice]), reverse=True))
         if usr_choice == 3:
-            movies = {k: movies[k] for k in sorted(movies)}
+            movies = MovieCollection((k, movies[k]) for k in sorted(movies))
         my_html_str = ''
         for k, v in movies.items():
-            img_el = (f'<a href="{GOOGLE_PREFIX}{k} {v['year']}" '
+            img_el = (f'<a href="{GOOGLE_PREFIX}{k} {v.year}" '
                       f'target="_blank"><img class="movie-poster" '
-                      f'src="{v['poster']}"/></a>')
-            if v['notes']:  # only include title= attr when there are Notes
-                img_el = (f'<a href="{GOOGLE_PREFIX}{k} {v['year']}" '
+                      f'src="{v.poster}"/></a>')
+            if v.notes:  # only include title= attr when there are Notes
+                img_el = (f'<a href="{GOOGLE_PREFIX}{k} {v.year}" '
                           f'target="_blank"><img class="movie-poster" '
-                          f'src="{v['poster']}" title="{v['notes']}"/></a>')
+                          f'src="{v.poster}" title="{v.notes}"/></a>')
             my_html_str += (
                 f'<li><div class="movie">{img_el}<div class="movie-rating">'
-                f'{v['rating']}</div><div class="movie-title">'
-                f'{k}</div><div class="movie-year">{v['year']}'
+                f'{v.rating}</div><div class="movie-title">'
+                f'{k}</div><div class="movie-year">{v.year}'
                 '</div></div></li>'
             )
         with open(HTML_TEMPL, "r") as fd:
@@ -302,6 +450,49 @@ class MovieApp:
             fd.write(updated_html)
         print("Website was generated successfully.")
 
+    def _command_search_notes(self):
+        """Prompt for words, print the movies whose notes or title contain
+        them, ranked by relevance (BM25, see utils/fulltext_index)."""
+        query = input("Enter words to look for in movie notes:\n> ").strip()
+        hits = self._get_notes_index().search(query, SEARCH_TOP_K)
+        if not hits:
+            print("\nNo notes or titles match that.")
+            return
+        movies = self._storage.list_movies()
+        print(f"\nThis is what I've found for <{query}>:")
+        for i, (k, _) in enumerate(hits):
+            v = movies[k]
+            notes = f", notes: {v.notes}" if v.notes else ''
+            print(f"  {i + 1}. <{k}> ({v.year}){notes}")
+
+    def _fresh_notes_index(self):
+        """Return the notes index if it is in sync with the DB, from memory
+        or from disk, else None. Never builds one: used right before a
+        mutation, which then gets applied to the index incrementally."""
+        fingerprint = db_fingerprint(self._storage.file_path)
+        if (self._notes_index is None
+                or self._notes_index.fingerprint != fingerprint):
+            self._notes_index = NotesIndex.load(
+                index_path_for(self._storage.file_path))
+        if (self._notes_index is None
+                or self._notes_index.fingerprint != fingerprint):
+            return None
+        return self._notes_index
+
+    def _get_notes_index(self):
+        """Return the notes index, (re)building it if it's out of sync."""
+        notes_index = self._fresh_notes_index()
+        if notes_index is None:
+            notes_index = NotesIndex.build(self._storage)
+            notes_index.save(index_path_for(self._storage.file_path))
+            self._notes_index = notes_index
+        return notes_index
+
+    def _save_notes_index(self, notes_index: NotesIndex):
+        """Persist an incrementally updated index as matching the DB now."""
+        notes_index.fingerprint = db_fingerprint(self._storage.file_path)
+        notes_index.save(index_path_for(self._storage.file_path))
+
     def _obtain_match_for_action(self, action: str):
         """Offer match candidates choice to user and ensure exact match.
         Used by commands delete_movie and update_movie."""
@@ -319,7 +510,7 @@ class MovieApp:
         print(f"\nThis is what I've found for <{query}>:")
         for i, mov in enumerate(candidates):
             k, v = next(iter(mov.items()))
-            print(f"  {i + 1}. <{k}> ({v.get('year')})")
+            print(f"  {i + 1}. <{k}> ({v.year})")
         # prompt user for candidate selection (insist on choice)
         while True:
             try:
@@ -334,27 +525,61 @@ class MovieApp:
         return exact_title_str
 
     def _fetch_lookup_matches(self, query: str):
-        """Parent function of (a) partial && exact match scenarios, and
-        (b) fuzzy_search if none found in (a). Returns a list of dictionaries
-        or empty list if no matches. MATCH_COEFFICIENT const mandates min
-        query len for (a). I've chosen to focus on deletions and substitutions
-        as parameters of editing distance, i.e. I partially disregard
-        insertions in that I accept 'if query in key' as a match here, which
-        foregoes looking for candidates in fuzzy_matching utility."""
-        candidates = []
+        """Return a list of single-entry dictionaries, best match first, or
+        empty list if no matches. Exact, prefix, word and fuzzy matches are
+        ranked together by get_ranked_candidates (see utils/ranked_search),
+        which only ever keeps the SEARCH_TOP_K best of them."""
         if not query:
-            return candidates
-        movies = self._storage.list_movies()
-        # (a) partial && exact match scenarios
-        for i, (k, v) in enumerate(movies.items()):
-            for word in k.lower().split():
-                if (query.lower() in word
-                        and len(query) > len(word) * MATCH_COEFFICIENT):
-                    candidates.append({k: v})
-        # (b) fuzzy string matching worth a shot
-        if not candidates:
-            candidates = get_fuzzy_srch_candidates(query, movies)
-        return candidates
+            return []
+        movies = self._cached_movies()
+        ranked = get_ranked_candidates(query, movies, SEARCH_TOP_K,
+                                       self._get_fuzzy_matcher())
+        return [{title: movies[title]} for title, _ in ranked]
+
+    def _get_fuzzy_matcher(self):
+        """Return a ParallelFuzzyMatcher for big DBs, else None (serial).
+        The worker processes hold the titles of the cached collection and
+        are kept for as long as it is, so titles only get shipped once."""
+        movies = self._cached_movies()
+        if not should_parallelize(len(movies), self._fuzzy_workers,
+                                  self._parallel_min_titles):
+            return None
+        if self._fuzzy_matcher is None:
+            self._fuzzy_matcher = ParallelFuzzyMatcher(movies,
+                                                       self._fuzzy_workers)
+        return self._fuzzy_matcher
+
+    def watch(self, sort_choice=0, histogram_name=DEFAULT_HISTOGRAM_NAME):
+        """Non-interactive alternative to run(): regenerate the webpage and
+        the ratings histogram whenever the DB changes, until Ctrl+C. Each
+        output is only redone if its own inputs changed, e.g. editing notes
+        re-renders the webpage but leaves the histogram alone."""
+        print(f"Watching ./{self._storage.file_path} (Ctrl+C to stop)")
+        # created before the initial render, which an edit may overlap
+        watcher = DbWatcher(self._storage.file_path)
+        webpage_key = histogram_key = None
+        try:
+            for _ in self._initial_run_then(watcher):
+                movies = self._storage.list_movies()
+                new_webpage_key = hash(tuple(
+                    (k, v.year, v.rating, v.poster, v.notes)
+                    for k, v in movies.items()))
+                new_histogram_key = hash(tuple(
+                    sorted(v.rating for v in movies.values())))
+                if new_webpage_key != webpage_key:
+                    self._write_webpage(movies, sort_choice)
+                    webpage_key = new_webpage_key
+                if new_histogram_key != histogram_key:
+                    self._save_ratings_histogram(movies, histogram_name)
+                    histogram_key = new_histogram_key
+        except KeyboardInterrupt:
+            print("\nBye!")
+
+    @staticmethod
+    def _initial_run_then(changes):
+        """Yield once right away, then once per change."""
+        yield
+        yield from changes
 
     def run(self):
         """Initialize dispatcher table once at start of runtime. Until exit,
@@ -371,7 +596,9 @@ class MovieApp:
                      9: self._command_movies_sorted_by_year,
                      10: self._command_filter_movies,
                      11: self._command_create_ratings_histogram,
-                     12: self._command_generate_webpage
+                     12: self._command_generate_webpage,
+                     13: self._command_search_notes,
+                     14: self._command_query_movies
                      }
         menu_len = len(func_dict)
         print(WELCOME_HEADER)
@@ -0,0 +1,52 @@
+"""Transparent compression for DB files. 'data.json.gz', 'data.csv.xz' or
+'data.json.lzma' are read and written through the stdlib codec matching the
+last extension, streaming, so the storages never see the compressed bytes.
+Every row repeats the same keys and poster URL prefix, which is exactly
+what these codecs squeeze out. See benchmarks/compression_benchmark.py."""
+
+import os
+import gzip
+import lzma
+
+TMP_SUFFIX = '.tmp'
+GZIP_LEVEL = 6  # zlib's own default, much faster than gzip.open()'s 9
+_OPENERS = {
+    '.gz': lambda path, mode, newline: gzip.open(
+        path, mode, compresslevel=GZIP_LEVEL, newline=newline),
+    '.xz': lambda path, mode, newline: lzma.open(
+        path, mode, newline=newline),
+    '.lzma': lambda path, mode, newline: lzma.open(
+        path, mode, format=lzma.FORMAT_ALONE, newline=newline),
+}
+COMPRESSION_EXTS = tuple(_OPENERS)
+
+
+def split_compression_ext(path: str):
+    """Return (path without compression ext, compression ext or '')."""
+    for ext in COMPRESSION_EXTS:
+        if path.endswith(ext):
+            return path[:-len(ext)], ext
+    return path, ''
+
+
+def strip_compression_ext(path: str):
+    """'data.json.gz' -> 'data.json', 'data.json' -> 'data.json'."""
+    return split_compression_ext(path)[0]
+
+
+def tmp_path_for(path: str):
+    """Temp file name which keeps the compression ext, so that a writer can
+    open it with the same codec: 'data.json.gz' -> 'data.json.tmp.gz'."""
+    base, ext = split_compression_ext(path)
+    return base + TMP_SUFFIX + ext
+
+
+def open_db_file(path: str, mode: str, newline=None):
+    """Drop-in for open(path, mode, newline=newline) in text mode ("r" or
+    "w") that (de)compresses on the fly according to the file extension. A
+    freshly created, still empty file is read as an empty DB whatever its
+    ext."""
+    ext = split_compression_ext(path)[1]
+    if not ext or ('r' in mode and os.path.getsize(path) == 0):
+        return open(path, mode, newline=newline)
+    return _OPENERS[ext](path, mode.replace('t', '') + 't', newline)
@@ -0,0 +1,55 @@
+"""Streams a movie DB from one storage backend into another, e.g.
+python3 -m storage.convert data/data.json data/data_copy.csv
+
+Records flow through a generator pipeline (source.iter_movies() straight
+into target.write_movies()), so memory stays bounded no matter the DB size
+and the target file is written exactly once. Malformed source entries are
+reported and skipped instead of aborting the conversion."""
+
+import os
+import argparse
+from .storage_factory import get_storage
+
+
+def convert_storage(source, target, on_error=None):
+    """Copy every valid movie from 'source' to 'target' (both IStorage).
+    Return (number of movies written, list of (location, error) for the
+    skipped entries). 'on_error' is additionally called for each of them."""
+    skipped = []
+
+    def collect_error(location: str, error: Exception):
+        skipped.append((location, error))
+        if on_error is not None:
+            on_error(location, error)
+
+    count = target.write_movies(source.iter_movies(collect_error))
+    return count, skipped
+
+
+def main():
+    """Expects a source and a target DB path, converts between them."""
+    parser = argparse.ArgumentParser(
+        prog='python3 -m storage.convert',
+        description='MovieApp: convert a DB between storage formats')
+    parser.add_argument("source", help="existing DB to read from")
+    parser.add_argument("target", help="DB to (over)write")
+    args = parser.parse_args()
+    if not os.path.exists(args.source):
+        print(f"Error: <{args.source}> not found.")
+        exit(1)
+    try:
+        source = get_storage(args.source)
+        target = get_storage(args.target)
+        count, skipped = convert_storage(
+            source, target,
+            on_error=lambda loc, e: print(f"Skipping {loc}: {e}"))
+    except (TypeError, ValueError, OSError) as e:
+        # unknown format, incomplete shards, missing/unwritable target dir
+        print(f"Error: {e}")
+        exit(1)
+    print(f"Converted {count} movies from <{args.source}> to "
+          f"<{args.target}>, skipped {len(skipped)} malformed entries.")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,23 +1,53 @@
 from abc import ABC, abstractmethod
+from .movie import MovieCollection
 
 
 class IStorage(ABC):
     @abstractmethod
     def list_movies(self):
-        """Return parsed DB as a Python data structure"""
+        """Return parsed DB as a title-keyed MovieCollection"""
         pass
 
     @abstractmethod
     def add_movie(self, title, year, rating, poster):
-        """Add entry to data"""
+        """Add entry to data. Return True if it was added."""
         pass
 
     @abstractmethod
     def delete_movie(self, title):
-        """Delete entry from data"""
+        """Delete entry from data. Return True if it was deleted."""
         pass
 
     @abstractmethod
     def update_movie(self, title):
-        """Add non-default info: 'movie notes'."""
+        """Add non-default info: 'movie notes'. Return the new notes, or
+        None if nothing was updated."""
         pass
+
+    @abstractmethod
+    def iter_movies(self, on_error=None):
+        """Lazily yield (title, Movie) pairs. Malformed entries are skipped
+        and reported as on_error(location, error) instead of aborting."""
+        pass
+
+    @abstractmethod
+    def write_movies(self, records):
+        """Replace data with an iterable of (title, Movie) pairs, streaming.
+        Return the number of movies written."""
+        pass
+
+    def _list_movies_for_update(self):
+        """list_movies() for the add/delete/update protocols, which write
+        the result back whole. An entry that couldn't be read would be
+        missing from that write and lost for good, so if there is any, say
+        which and return None instead: the caller then leaves the DB as is."""
+        skipped = []
+        movies = MovieCollection(self.iter_movies(
+            lambda location, error: skipped.append((location, error))))
+        if not skipped:
+            return movies
+        for location, error in skipped:
+            print(f"Error reading <{self.file_path}> ({location}): {error}")
+        print(f"Error: <{self.file_path}> left unchanged so that the "
+              f"unreadable entries above don't get lost. Fix them first.")
+        return None
@@ -0,0 +1,78 @@
+"""Compact in-memory representation of the movie DB. A title-keyed
+MovieCollection of slotted Movie records replaces the former dict-of-dicts,
+which cost an inner dict with four string keys per row. The poster URLs all
+share the same base ('https://image.tmdb.org/t/p/w500/'), so each record keeps
+an interned reference to that prefix and only stores its own unique tail.
+Any other keys a JSON entry carries are kept in 'extras' and written back."""
+
+import sys
+
+FIELDS = ('year', 'rating', 'poster', 'notes')
+
+
+class Movie:
+    """A single DB entry without its title (the title is the collection key).
+    Supports movie['year'] and movie.get('year') as a read-only dict view so
+    that code written against the old inner dicts keeps working."""
+    __slots__ = ('year', 'rating', '_poster_prefix', '_poster_tail', 'notes',
+                 'extras')
+
+    def __init__(self, year: int, rating: float, poster: str, notes='',
+                 extras=None):
+        self.year = year
+        self.rating = rating
+        self.poster = poster
+        self.notes = notes
+        self.extras = extras  # {key: value} beyond FIELDS, None if none
+
+    @property
+    def poster(self):
+        """Reassemble the full poster URL from the shared prefix."""
+        return self._poster_prefix + self._poster_tail
+
+    @poster.setter
+    def poster(self, url: str):
+        """Split on the last '/', interning the part which every poster URL
+        of the same image size has in common."""
+        split_idx = url.rfind('/') + 1
+        self._poster_prefix = sys.intern(url[:split_idx])
+        self._poster_tail = url[split_idx:]
+
+    def __getitem__(self, key: str):
+        if key not in FIELDS:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def get(self, key: str, default=None):
+        """Same semantics as dict.get() on the old inner dict."""
+        if key not in FIELDS:
+            return default
+        return getattr(self, key)
+
+    def as_dict(self):
+        """Return the inner dict the way the DB files store it."""
+        fields = {'year': self.year,
+                  'rating': self.rating,
+                  'poster': self.poster,
+                  'notes': self.notes}
+        if self.extras:
+            fields.update(self.extras)
+        return fields
+
+    def __eq__(self, other):
+        if not isinstance(other, Movie):
+            return NotImplemented
+        return self.as_dict() == other.as_dict()
+
+    def __repr__(self):
+        return (f"Movie(year={self.year!r}, rating={self.rating!r}, "
+                f"poster={self.poster!r}, notes={self.notes!r})")
+
+
+class MovieCollection(dict):
+    """Title-keyed collection of Movie records, returned by every storage's
+    list_movies(). Being a dict, it iterates, sorts and looks up exactly like
+    the dict-of-dicts did; as_dict() is there for serialization."""
+    def as_dict(self):
+        """Return the dict-of-dicts representation, e.g. for json.dumps()."""
+        return {title: movie.as_dict() for title, movie in self.items()}
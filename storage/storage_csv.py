@@ -1,4 +1,10 @@
+import os
+import csv
 from .istorage import IStorage
+from .movie import Movie, MovieCollection
+from .compression import open_db_file, tmp_path_for
+
+CSV_HEADER = ('title', 'rating', 'year', 'poster', 'notes')
 
 
 class StorageCsv(IStorage):
@@ -13,68 +19,108 @@ class StorageCsv(IStorage):
         return self._file_path
 
     def list_movies(self):
-        """Returns a dictionary of dictionaries that contains the movies
+        """Returns a MovieCollection that contains the movies
         information in the database. The function loads the information
-        from a JSON file and returns the data."""
-        with open(self.file_path, "r") as fd:
-            dict_of_dicts = {}  # security measure in case of empty file
-            lines = fd.readlines()
-        if not lines:
-            return dict_of_dicts
+        from a CSV file and returns the data. Malformed lines get reported
+        and skipped rather than ending the load."""
+        return MovieCollection(self.iter_movies())
+
+    def iter_movies(self, on_error=None):
+        """Yields (title, Movie) pairs, reading the CSV file row by row.
+        Quoted fields may hold commas and newlines."""
+        if on_error is None:
+            on_error = _print_read_error
+        with open_db_file(self.file_path, "r", newline='') as fd:
+            reader = csv.reader(fd)
+            try:
+                for fields in reader:
+                    if reader.line_num == 1 or not fields:  # header, blank
+                        continue
+                    try:
+                        yield _parse_row(fields)
+                    except ValueError as e:
+                        on_error(f"line {reader.line_num}", e)
+            except csv.Error as e:  # unreadable from here on
+                on_error(f"line {reader.line_num}", e)
+
+    def write_movies(self, records):
+        """Streams (title, Movie) pairs into a temp file row by row, then
+        swaps it in. Swapping rather than truncating lets 'records' come from
+        this very file. Fields with commas, quotes or newlines get quoted."""
+        count = 0
+        tmp_path = tmp_path_for(self.file_path)
         try:
-            for i, line in enumerate(lines):
-                if i == 0:
-                    continue
-                title, rating, year, poster, notes = line.split(',')
-                notes = notes.strip()  # rm trailing \n from line end
-                movie = {title: {'year': int(year),
-                                 'rating': float(rating),
-                                 'poster': poster,
-                                 'notes': notes}
-                         }
-                dict_of_dicts.update(movie)
-        except Exception as e:  # whichever the error, visualize it
-            print(f"Error reading from csv: {e}")
-        return dict_of_dicts
+            with open_db_file(tmp_path, "w", newline='') as fd:
+                writer = csv.writer(fd, lineterminator='\n')
+                writer.writerow(CSV_HEADER)
+                for k, v in records:
+                    writer.writerow((k, v.rating, v.year, v.poster, v.notes))
+                    count += 1
+        except BaseException:  # e.g. 'records' failing mid-stream, or Ctrl+C
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        os.replace(tmp_path, self.file_path)
+        return count
 
     def add_movie(self, title: str, year: str, rating: float, poster: str):
         """Adds a movie to the movie database.
         Loads the information from the CSV file, adds the movie,
         and saves it. The function doesn't validate input. To avoid loading
-        DB in StorageApp, I had to have the 2 messages here"""
-        movies = self.list_movies()
+        DB in StorageApp, I had to have the 2 messages here.
+        Returns True if the movie got added."""
+        movies = self._list_movies_for_update()
+        if movies is None:
+            return False
         if title in movies.keys():
             print(f"Movie {title} already exists!")
-            return
-        movie = {title: {"year": year,
-                         "rating": rating,
-                         "poster": poster,
-                         "notes": ''}
-                 }
-        movies.update(movie)
+            return False
+        movies[title] = Movie(year, rating, poster)
         self._write_to_csv(movies)
         print(f"Movie {title} successfully added")
+        return True
 
     def delete_movie(self, title: str):
         """Deletes a movie from the movie database. Loads the information from
         the CSV file, deletes the movie, and saves it. The function doesn't
-        validate the input. Exact title already proven to exist by caller."""
-        movies = self.list_movies()
+        validate the input. Exact title already proven to exist by caller.
+        Returns True if the movie got deleted."""
+        movies = self._list_movies_for_update()
+        if movies is None:
+            return False
         movies.pop(title)
         self._write_to_csv(movies)
+        return True
 
     def update_movie(self, title: str):
         """Updates a movie from the movie database with user-specified notes.
-        Allows any input for 'notes', incl. empty string (default)."""
-        movies = self.list_movies()
-        movies[title]['notes'] = input("Enter movie notes:\n> ")
+        Allows any input for 'notes', incl. empty string (default).
+        Returns the new notes, or None if the DB was left unchanged."""
+        movies = self._list_movies_for_update()
+        if movies is None:
+            return None
+        movies[title].notes = input("Enter movie notes:\n> ")
         self._write_to_csv(movies)
+        return movies[title].notes
 
-    def _write_to_csv(self, movies: dict):
+    def _write_to_csv(self, movies: MovieCollection):
         """Protocol for writing to .csv."""
-        lines = "title,rating,year,poster,notes\n"
-        for k, v in movies.items():
-            lines += (f"{k},{v['rating']},{v['year']},"
-                      f"{v['poster']},{v['notes']}\n")
-        with open(self.file_path, "w") as fd:
-            fd.write(lines)
+        self.write_movies(movies.items())
+
+
+def _parse_row(fields: list):
+    """Return (title, Movie) for one CSV row or raise ValueError. Files
+    written before quoting was used may have bare commas in the notes, the
+    last column, so any surplus fields are joined back into them."""
+    if len(fields) < 5:
+        raise ValueError(f"expected 5 fields, found {len(fields)}")
+    title, rating, year, poster = fields[:4]
+    notes = ','.join(fields[4:])
+    if not title:
+        raise ValueError("empty title")
+    return title, Movie(int(year), float(rating), poster, notes)
+
+
+def _print_read_error(location: str, error: Exception):
+    """Default on_error: tell the user and carry on with the next line."""
+    print(f"Error reading from csv ({location}): {error}")
@@ -0,0 +1,22 @@
+"""Picks the storage backend matching a DB path, so that main.py and the
+conversion tool agree on which extension means which format."""
+
+import os
+from .storage_json import StorageJson
+from .storage_csv import StorageCsv
+from .storage_sharded import StorageSharded
+from .compression import strip_compression_ext
+
+
+def get_storage(file_path: str):
+    """Return a StorageSharded for a directory, else a StorageJson or
+    StorageCsv for 'file_path' by its extension, compressed or not."""
+    if os.path.isdir(file_path):
+        return StorageSharded(file_path)
+    base_path = strip_compression_ext(file_path)
+    if base_path.endswith(".json"):
+        return StorageJson(file_path)
+    if base_path.endswith(".csv"):
+        return StorageCsv(file_path)
+    raise TypeError(
+        f"No storage for <{file_path}>, must be .json, .csv or a dir")
@@ -1,5 +1,82 @@
+import os
 import json
 from .istorage import IStorage
+from .movie import FIELDS, Movie, MovieCollection
+from .compression import open_db_file, tmp_path_for
+
+READ_CHUNK_SZ = 65536
+
+
+class _JsonObjectStream:
+    """Reads the top-level {"title": {...}, ...} object of a DB file one
+    member at a time, so memory is bounded by the chunk size plus the
+    largest single entry rather than by the size of the file."""
+    def __init__(self, fd):
+        self._fd = fd
+        self._decoder = json.JSONDecoder()
+        self._buf = ''
+        self._pos = 0
+        self._eof = False
+
+    def _fill(self):
+        """Drop the consumed part of the buffer and read another chunk."""
+        chunk = self._fd.read(READ_CHUNK_SZ)
+        if not chunk:
+            self._eof = True
+        self._buf = self._buf[self._pos:] + chunk
+        self._pos = 0
+
+    def _peek(self):
+        """Return the next non-whitespace char without consuming it,
+        or '' at end of file."""
+        while True:
+            while (self._pos < len(self._buf)
+                   and self._buf[self._pos] in ' \t\r\n'):
+                self._pos += 1
+            if self._pos < len(self._buf) or self._eof:
+                break
+            self._fill()
+        return self._buf[self._pos:self._pos + 1]
+
+    def _expect(self, chars: str):
+        """Consume the next char, which has to be one of 'chars'."""
+        char = self._peek()
+        if not char or char not in chars:
+            raise ValueError(f"expected one of {chars!r} at char "
+                             f"{self._pos}, found {char or 'end of file'!r}")
+        self._pos += 1
+        return char
+
+    def _decode(self):
+        """Decode one JSON value. A value touching the end of the buffer
+        might be cut short (think 7 of 7.2), so read on before trusting it."""
+        self._peek()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buf, self._pos)
+                if end < len(self._buf) or self._eof:
+                    self._pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self._eof:
+                    raise
+            self._fill()
+
+    def __iter__(self):
+        """Yield (key, value) pairs. An empty file yields nothing."""
+        if not self._peek():
+            return
+        self._expect('{')
+        if self._peek() == '}':
+            return
+        while True:
+            key = self._decode()
+            if not isinstance(key, str):
+                raise ValueError(f"expected a title string, found {key!r}")
+            self._expect(':')
+            yield key, self._decode()
+            if self._expect(',}') == '}':
+                return
 
 
 class StorageJson(IStorage):
@@ -14,55 +91,122 @@ class StorageJson(IStorage):
         return self._file_path
 
     def list_movies(self):
-        """Returns a dictionary of dictionaries that contains the movies
+        """Returns a MovieCollection that contains the movies
         information in the database. The function loads the information
-        from a JSON file and returns the data."""
-        with open(self.file_path, "r") as fd:
-            dict_of_dicts = {}  # security measure in case of empty file
-            raw_str = fd.read()
-        if not raw_str:
-            return dict_of_dicts
+        from a JSON file and returns the data. Malformed entries get
+        reported and skipped rather than ending the load."""
+        return MovieCollection(self.iter_movies())
+
+    def iter_movies(self, on_error=None):
+        """Yields (title, Movie) pairs while reading the JSON file in chunks.
+        Entries with missing or badly typed fields are reported and skipped,
+        but a syntax error ends the stream since JSON can't be resynced."""
+        if on_error is None:
+            on_error = _print_read_error
+        with open_db_file(self.file_path, "r") as fd:
+            try:
+                for title, fields in _JsonObjectStream(fd):
+                    try:
+                        yield title, _validated_movie(fields)
+                    except (KeyError, TypeError, ValueError) as e:
+                        on_error(f"entry <{title}>", e)
+            except ValueError as e:  # JSONDecodeError is a ValueError
+                on_error("file structure", e)
+
+    def write_movies(self, records):
+        """Streams (title, Movie) pairs into a temp file in the same format
+        json.dumps() produces, then swaps it in. Swapping rather than
+        truncating lets 'records' come from this very file."""
+        count = 0
+        tmp_path = tmp_path_for(self.file_path)
         try:
-            dict_of_dicts = json.loads(raw_str)
-        except Exception as e:  # whatever err json raises I want it
-            print(f"Error reading from json: {e}")
-        return dict_of_dicts
+            with open_db_file(tmp_path, "w") as fd:
+                fd.write('{')
+                for title, movie in records:
+                    if count:
+                        fd.write(', ')
+                    fd.write(format_json_member(title, movie))
+                    count += 1
+                fd.write('}')
+        except BaseException:  # e.g. 'records' failing mid-stream, or Ctrl+C
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        os.replace(tmp_path, self.file_path)
+        return count
 
     def add_movie(self, title: str, year: str, rating: float, poster: str):
         """Adds a movie to the movie database.
         Loads the information from the JSON file, adds the movie,
         and saves it. The function doesn't validate input. To avoid loading
-        DB in StorageApp, I had to have the 2 messages here"""
-        movies = self.list_movies()
+        DB in StorageApp, I had to have the 2 messages here.
+        Returns True if the movie got added."""
+        movies = self._list_movies_for_update()
+        if movies is None:
+            return False
         if title in movies.keys():
             print(f"Movie {title} already exists!")
-            return
-        movie = {title: {"year": year,
-                         "rating": rating,
-                         "poster": poster,
-                         "notes": ''}
-                 }
-        movies.update(movie)
+            return False
+        movies[title] = Movie(year, rating, poster)
         self._write_to_json(movies)
         print(f"Movie {title} successfully added")
+        return True
 
     def delete_movie(self, title: str):
         """Deletes a movie from the movie database. Loads the information from
         the JSON file, deletes the movie, and saves it. The function doesn't
-        validate the input. Exact title already proven to exist by caller."""
-        movies = self.list_movies()
+        validate the input. Exact title already proven to exist by caller.
+        Returns True if the movie got deleted."""
+        movies = self._list_movies_for_update()
+        if movies is None:
+            return False
         movies.pop(title)
         self._write_to_json(movies)
+        return True
 
     def update_movie(self, title: str):
         """Updates a movie from the movie database with user-specified notes.
-        Allows any input for 'notes', incl. empty string (default)."""
-        movies = self.list_movies()
-        movies[title]['notes'] = input("Enter movie notes:\n> ")
+        Allows any input for 'notes', incl. empty string (default).
+        Returns the new notes, or None if the DB was left unchanged."""
+        movies = self._list_movies_for_update()
+        if movies is None:
+            return None
+        movies[title].notes = input("Enter movie notes:\n> ")
         self._write_to_json(movies)
+        return movies[title].notes
 
-    def _write_to_json(self, movies: dict):
+    def _write_to_json(self, movies: MovieCollection):
         """Protocol for writing to .json."""
-        movies_as_str = json.dumps(movies)
-        with open(self.file_path, "w") as fd:
-            fd.write(movies_as_str)
+        self.write_movies(movies.items())
+
+
+def format_json_member(title: str, movie: Movie):
+    """Return '"title": {...}' exactly as json.dumps() of the whole DB
+    would spell it, for writers that stream one member at a time."""
+    return f"{json.dumps(title)}: {json.dumps(movie.as_dict())}"
+
+
+def _validated_movie(fields: dict):
+    """Build a Movie from an inner dict, insisting on sane field types.
+    Keys beyond the known fields ride along untouched in Movie.extras."""
+    if not isinstance(fields, dict):
+        raise TypeError(f"expected an object, found {fields!r}")
+    year, rating = fields['year'], fields['rating']
+    if not isinstance(year, int) or isinstance(year, bool):
+        raise TypeError(f"year must be an integer, found {year!r}")
+    if not isinstance(rating, (int, float)) or isinstance(rating, bool):
+        raise TypeError(f"rating must be a number, found {rating!r}")
+    poster = fields.get('poster')
+    if poster is None:  # older entries may lack one, they still load
+        poster = ''
+    if not isinstance(poster, str):
+        raise TypeError(f"poster must be a string, found {poster!r}")
+    extras = {key: value for key, value in fields.items()
+              if key not in FIELDS}
+    return Movie(year, float(rating), poster, str(fields.get('notes', '')),
+                 extras or None)
+
+
+def _print_read_error(location: str, error: Exception):
+    """Default on_error: tell the user and carry on with the next entry."""
+    print(f"Error reading from json ({location}): {error}")
@@ -0,0 +1,144 @@
+import os
+import zlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from .istorage import IStorage
+from .movie import MovieCollection
+from .storage_json import StorageJson, format_json_member
+from .compression import tmp_path_for
+
+SHARD_COUNT = 16
+SHARD_PREFIX = 'shard_'
+SHARD_EXT = '.json'
+MAX_READ_WORKERS = 8
+
+
+class StorageSharded(IStorage):
+    """A subclass of an abstract class, meant to handle a directory of json
+    shard files. Each title lives in the shard picked by a stable hash of
+    it, so add/delete/update only ever rewrite that one shard's file."""
+    def __init__(self, dir_path_arg, shard_count=SHARD_COUNT):
+        self._dir_path = dir_path_arg
+        existing = self._find_shard_files()
+        if existing:  # an existing DB dictates its own shard count
+            shard_count = len(existing)
+        self._shards = [
+            StorageJson(os.path.join(self._dir_path, _shard_name(i)))
+            for i in range(shard_count)
+        ]
+        for shard in self._shards:
+            if not os.path.exists(shard.file_path):
+                fd = os.open(shard.file_path, os.O_CREAT)
+                os.close(fd)
+
+    @property
+    def file_path(self):
+        """The shard directory, named so to match the other storages."""
+        return self._dir_path
+
+    @property
+    def shard_count(self):
+        return len(self._shards)
+
+    def _find_shard_files(self):
+        """Return the sorted shard file names present in the directory.
+        Insists on a gap-free shard_000 .. shard_<N-1> sequence, since a
+        missing shard would silently re-hash titles into the wrong files."""
+        names = sorted(name for name in os.listdir(self._dir_path)
+                       if name.startswith(SHARD_PREFIX)
+                       and name.endswith(SHARD_EXT))
+        if names != [_shard_name(i) for i in range(len(names))]:
+            raise ValueError(
+                f"Incomplete set of shards in <{self._dir_path}>")
+        return names
+
+    def _shard_idx(self, title: str):
+        """crc32 rather than hash(), which is salted differently per run."""
+        return zlib.crc32(title.encode('utf-8')) % len(self._shards)
+
+    def _shard_for(self, title: str):
+        return self._shards[self._shard_idx(title)]
+
+    def list_movies(self):
+        """Returns a MovieCollection that contains the movies
+        information in the database, merged from all shards."""
+        return MovieCollection(self.iter_movies())
+
+    def iter_movies(self, on_error=None):
+        """Yields (title, Movie) pairs shard after shard. Shards are read by
+        a thread pool, with at most MAX_READ_WORKERS of them read ahead, so
+        only a few shards are ever held in memory at once."""
+        workers = min(MAX_READ_WORKERS, len(self._shards))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            pending = deque()
+            shards = iter(self._shards)
+            for shard in shards:
+                pending.append(executor.submit(_read_shard, shard, on_error))
+                if len(pending) == workers:
+                    break
+            while pending:
+                yield from pending.popleft().result()
+                shard = next(shards, None)
+                if shard is not None:
+                    pending.append(
+                        executor.submit(_read_shard, shard, on_error))
+
+    def write_movies(self, records):
+        """Streams (title, Movie) pairs into one temp file per shard, then
+        swaps them all in. Return the number of movies written. If anything
+        fails on the way, the temp files are removed and the shards are
+        left untouched."""
+        count = 0
+        tmp_paths = [tmp_path_for(shard.file_path) for shard in self._shards]
+        fds = []
+        try:
+            for tmp_path in tmp_paths:
+                fds.append(open(tmp_path, "w"))
+            is_first = [True] * len(fds)
+            for fd in fds:
+                fd.write('{')
+            for title, movie in records:
+                shard_idx = self._shard_idx(title)
+                if not is_first[shard_idx]:
+                    fds[shard_idx].write(', ')
+                fds[shard_idx].write(format_json_member(title, movie))
+                is_first[shard_idx] = False
+                count += 1
+            for fd in fds:
+                fd.write('}')
+        except BaseException:  # incl. Ctrl+C, don't litter the DB dir
+            for fd in fds:
+                fd.close()
+                os.remove(fd.name)
+            raise
+        finally:
+            for fd in fds:
+                fd.close()
+        for shard, tmp_path in zip(self._shards, tmp_paths):
+            os.replace(tmp_path, shard.file_path)
+        return count
+
+    def add_movie(self, title: str, year: str, rating: float, poster: str):
+        """Adds a movie to the movie database by adding it to its shard.
+        Returns True if the movie got added."""
+        return self._shard_for(title).add_movie(title, year, rating, poster)
+
+    def delete_movie(self, title: str):
+        """Deletes a movie from the movie database by deleting it from its
+        shard. Exact title already proven to exist by caller.
+        Returns True if the movie got deleted."""
+        return self._shard_for(title).delete_movie(title)
+
+    def update_movie(self, title: str):
+        """Updates a movie's notes, only touching the movie's shard.
+        Returns the new notes, or None if the shard was left unchanged."""
+        return self._shard_for(title).update_movie(title)
+
+
+def _shard_name(shard_idx: int):
+    return f"{SHARD_PREFIX}{shard_idx:03d}{SHARD_EXT}"
+
+
+def _read_shard(shard: StorageJson, on_error):
+    """Thread pool task: read one whole shard."""
+    return list(shard.iter_movies(on_error))
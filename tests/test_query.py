@@ -0,0 +1,77 @@
+import random
+import pytest
+from storage.movie import Movie, MovieCollection
+from utils.query import (compile_query, tokenize, IndexedCollection,
+                         _Parser, _numeric_bounds)
+
+
+def make_movies(count=500, seed=7):
+    rng = random.Random(seed)
+    words = ['Star', 'Wars', 'Die', 'Hard', 'Love', 'Story', 'Night']
+    movies = MovieCollection()
+    for i in range(count):
+        title = f"{rng.choice(words)} {rng.choice(words)} {i}"
+        movies[title] = Movie(rng.randrange(1950, 2024),
+                              round(rng.uniform(1, 10), 1),
+                              f"https://image.tmdb.org/t/p/w500/{i}.jpg",
+                              rng.choice(['', 'rewatch', 'boring plot']))
+    return movies
+
+
+def test_tokenize_keywords_numbers_strings():
+    assert tokenize('Rating>=7.5 AND title~"a \\"b\\""') == [
+        ('word', 'Rating'), ('op', '>='), ('number', 7.5),
+        ('keyword', 'and'), ('word', 'title'), ('op', '~'),
+        ('string', 'a "b"')]
+
+
+@pytest.mark.parametrize('text', [
+    'rating >= ',
+    'rating ~ 7',
+    'title > 3',
+    'year in 1990 1999',
+    'budget > 3',
+    '(rating > 3',
+    'rating > 3 limit 2.5',
+    'rating > 3 order rating',
+    'rating > 3 junk',
+    'rating # 3',
+])
+def test_parse_errors(text):
+    with pytest.raises(ValueError):
+        compile_query(text)
+
+
+def test_bounds_from_top_level_ands_only():
+    node = _Parser(tokenize(
+        'rating>=7 and year in 1990..1999 and rating<9 and year>1992'
+        ' and (rating > 8)')).parse()[0]
+    assert _numeric_bounds(node) == {'rating': (8, 9), 'year': (1992, 1999)}
+    node = _Parser(tokenize('rating>=7 or year=1990')).parse()[0]
+    assert _numeric_bounds(node) == {}
+    node = _Parser(tokenize('not rating>=7 and year=1990')).parse()[0]
+    assert _numeric_bounds(node) == {'year': (1990, 1990)}
+
+
+@pytest.mark.parametrize('text', [
+    '',
+    'limit 5',
+    'rating in 7..8 limit 5',
+    'rating>=7.5 and year in 1990..1999 order by rating desc limit 20',
+    'rating > 5 and rating < 6 order by year',
+    'year = 2000 or notes~"REWATCH" order by title limit 7',
+    'not (rating < 9) order by rating asc',
+    'title~"star" and year >= 2010 order by year desc limit 3',
+    'rating >= 9.9 and year <= 1951',
+    'order by rating limit 10',
+])
+def test_index_and_scan_agree(text):
+    movies = make_movies()
+    plan = compile_query(text)
+    indexed = plan.execute(IndexedCollection(movies))
+    scanned = plan.execute(movies.items())
+    if plan.order_field is None and plan.limit is None:
+        assert sorted(indexed) == sorted(scanned)
+    else:
+        assert indexed == scanned
+    assert all(plan.predicate(*pair) for pair in indexed)
@@ -0,0 +1,96 @@
+import json
+import pytest
+from storage import storage_json
+from storage.movie import Movie
+from storage.storage_csv import StorageCsv
+from storage.storage_json import StorageJson
+
+MOVIES = {
+    'Crouching Tiger, Hidden Dragon': {
+        'year': 2000, 'rating': 7.8,
+        'poster': 'https://image.tmdb.org/t/p/w500/tiger.jpg',
+        'notes': 'line one\nline two, "quoted"'},
+    'Amadeus': {
+        'year': 1984, 'rating': 8.0,
+        'poster': 'https://image.tmdb.org/t/p/w500/amadeus.jpg',
+        'notes': ' leading space'},
+    'Ünïcode “title”': {
+        'year': 1999, 'rating': 7.25,
+        'poster': 'https://image.tmdb.org/t/p/w500/u.jpg', 'notes': ''},
+}
+
+
+def as_dicts(records):
+    return {title: movie.as_dict() for title, movie in records}
+
+
+def collect_errors(errors):
+    return lambda location, error: errors.append((location, error))
+
+
+@pytest.mark.parametrize('chunk_sz', list(range(1, 40)) + [65536])
+def test_json_stream_across_chunk_boundaries(tmp_path, monkeypatch,
+                                             chunk_sz):
+    """Every value, numbers like 7.25 included, gets split somewhere."""
+    db_path = tmp_path / 'db.json'
+    db_path.write_text(json.dumps(MOVIES, indent=1))
+    monkeypatch.setattr(storage_json, 'READ_CHUNK_SZ', chunk_sz)
+    errors = []
+    records = StorageJson(str(db_path)).iter_movies(collect_errors(errors))
+    assert as_dicts(records) == MOVIES
+    assert errors == []
+
+
+def test_json_bad_entry_skipped_and_syntax_error_stops(tmp_path):
+    db_path = tmp_path / 'db.json'
+    db_path.write_text('{"A": {"year": "1990", "rating": 7, "poster": ""},'
+                       ' "B": {"year": 1991, "rating": 7, "poster": ""},'
+                       ' "C": {"year": 1992 "rating"')
+    errors = []
+    records = list(StorageJson(str(db_path)).iter_movies(
+        collect_errors(errors)))
+    assert [title for title, _ in records] == ['B']
+    assert [location for location, _ in errors] == ['entry <A>',
+                                                    'file structure']
+
+
+def test_json_extra_keys_survive_a_rewrite(tmp_path):
+    db_path = tmp_path / 'db.json'
+    db_path.write_text(json.dumps(
+        {'A': {'year': 1, 'rating': 2.0, 'poster': 'p', 'notes': '',
+               'imdb': 'tt1'}}))
+    storage = StorageJson(str(db_path))
+    storage.write_movies(storage.iter_movies())
+    assert json.loads(db_path.read_text())['A']['imdb'] == 'tt1'
+
+
+def test_csv_quoting_round_trip(tmp_path):
+    storage = StorageCsv(str(tmp_path / 'db.csv'))
+    records = [(title, Movie(**fields)) for title, fields in MOVIES.items()]
+    assert storage.write_movies(records) == len(MOVIES)
+    errors = []
+    assert as_dicts(storage.iter_movies(collect_errors(errors))) == MOVIES
+    assert errors == []
+
+
+def test_csv_legacy_bare_commas_in_notes(tmp_path):
+    db_path = tmp_path / 'db.csv'
+    db_path.write_text('title,rating,year,poster,notes\n'
+                       'Amadeus,8.0,1984,p.jpg,Namesake, and more, notes\n'
+                       'Titanic,7.9,1997,t.jpg,\n')
+    movies = StorageCsv(str(db_path)).list_movies()
+    assert movies['Amadeus'].notes == 'Namesake, and more, notes'
+    assert movies['Titanic'] == Movie(1997, 7.9, 't.jpg')
+
+
+@pytest.mark.parametrize('storage_cls, content', [
+    (StorageJson, '{"A": {"year": "n/a", "rating": 7, "poster": "p"},'
+                  ' "B": {"year": 1990, "rating": 7, "poster": "p"}}'),
+    (StorageCsv, 'title,rating,year,poster,notes\n'
+                 'A,7.0,n/a,p,\nB,7.0,1990,p,\n'),
+])
+def test_no_rewrite_when_entries_unreadable(tmp_path, storage_cls, content):
+    db_path = tmp_path / 'db'
+    db_path.write_text(content)
+    assert storage_cls(str(db_path)).delete_movie('B') is False
+    assert db_path.read_text() == content
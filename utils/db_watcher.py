@@ -0,0 +1,47 @@
+"""Stdlib-only change detection for a DB file (or a sharded DB's directory)
+by polling its mtime/size fingerprint. Another process saving the DB in
+several quick writes is one burst: changes are only reported once the
+fingerprint has stayed the same for a whole debounce period."""
+
+import time
+from utils.fulltext_index import db_fingerprint
+
+POLL_INTERVAL_S = 1.0
+DEBOUNCE_S = 0.5
+
+
+def _fingerprint_or_none(db_path: str):
+    """A DB caught mid-replace (or deleted) just counts as changed."""
+    try:
+        return db_fingerprint(db_path)
+    except FileNotFoundError:
+        return None
+
+
+class DbWatcher:
+    """Iterate over a DbWatcher to block until the next settled change.
+    Changes count from the moment the watcher is created, so create it
+    before reading the DB for the first time."""
+    def __init__(self, db_path: str, poll_interval=POLL_INTERVAL_S,
+                 debounce=DEBOUNCE_S):
+        self._db_path = db_path
+        self._poll_interval = poll_interval
+        self._debounce = debounce
+        self._last_seen = _fingerprint_or_none(db_path)
+
+    def __iter__(self):
+        """Yield once per settled burst of changes, forever."""
+        while True:
+            time.sleep(self._poll_interval)
+            current = _fingerprint_or_none(self._db_path)
+            if current == self._last_seen:
+                continue
+            while True:  # debounce: wait for the burst to be over
+                time.sleep(self._debounce)
+                settled = _fingerprint_or_none(self._db_path)
+                if settled == current:
+                    break
+                current = settled
+            self._last_seen = current
+            if current is not None:  # nothing to render from a missing DB
+                yield
@@ -0,0 +1,207 @@
+"""Full-text search over movie titles and notes, ranked by BM25.
+
+The index is a forward index (title -> {term: count}) plus the inverted
+index derived from it (term -> {title: count}). Only the forward one gets
+persisted, next to the DB file as '<db file>.idx.json': inverting it on
+load is a cheap dict walk, and it is what lets a single movie be removed
+or re-indexed without knowing its old notes. The DB's mtime and size are
+stored along, and a mismatch means somebody else changed the DB, in which
+case the index is rebuilt from storage instead of trusted.
+
+Saving after a single-movie edit appends one line with just that movie's
+terms to '<db file>.idx.log' rather than rewriting the whole index. Loading
+replays the log over the snapshot, and once the log has grown past a
+quarter of the indexed movies, the next save writes a fresh snapshot and
+starts an empty log, which keeps the cost per edit constant on average."""
+
+import os
+import re
+import json
+import math
+import heapq
+
+INDEX_SUFFIX = '.idx.json'
+LOG_SUFFIX = '.idx.log'
+TMP_SUFFIX = '.tmp'
+COMPACT_RATIO = 0.25  # logged documents per indexed one before compaction
+BM25_K1 = 1.5
+BM25_B = 0.75
+TOKEN_PATTERN = re.compile(r"\w+")
+
+
+def tokenize(text: str):
+    """Lowercase word tokens: "Can't wait!" -> ['can', 't', 'wait']."""
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+def index_path_for(db_path: str):
+    """'data/data.json' -> 'data/data.json.idx.json'. Works for a sharded
+    DB's directory too: 'data/big/' -> 'data/big.idx.json'."""
+    return os.path.normpath(db_path) + INDEX_SUFFIX
+
+
+def _log_path_for(index_path: str):
+    """'data.json.idx.json' -> 'data.json.idx.log'."""
+    return index_path[:-len(INDEX_SUFFIX)] + LOG_SUFFIX
+
+
+def db_fingerprint(db_path: str):
+    """Cheap 'has the DB changed' check: [mtime_ns, size] of the DB file,
+    or of every file in a sharded DB's directory."""
+    if not os.path.isdir(db_path):
+        stat = os.stat(db_path)
+        return [stat.st_mtime_ns, stat.st_size]
+    fingerprint = []
+    for name in sorted(os.listdir(db_path)):
+        stat = os.stat(os.path.join(db_path, name))
+        fingerprint.append([name, stat.st_mtime_ns, stat.st_size])
+    return fingerprint
+
+
+class NotesIndex:
+    """Inverted index over 'title + notes' of every movie."""
+    def __init__(self):
+        self.fingerprint = None
+        self._doc_terms = {}  # title -> {term: count}
+        self._doc_lens = {}  # title -> number of tokens
+        self._postings = {}  # term -> {title: count}
+        self._total_len = 0
+        self._changed = set()  # titles changed since the last save/load
+        self._logged = None  # docs in the log on disk, None: no snapshot
+
+    def __contains__(self, title: str):
+        return title in self._doc_terms
+
+    def __len__(self):
+        return len(self._doc_terms)
+
+    def set_document(self, title: str, notes: str):
+        """(Re-)index a movie, e.g. after its notes changed."""
+        self.remove_document(title)
+        self._changed.add(title)
+        terms = {}
+        for term in tokenize(title) + tokenize(notes):
+            terms[term] = terms.get(term, 0) + 1
+        self._add_terms(title, terms)
+
+    def _add_terms(self, title: str, terms: dict):
+        self._doc_terms[title] = terms
+        doc_len = sum(terms.values())
+        self._doc_lens[title] = doc_len
+        self._total_len += doc_len
+        for term, count in terms.items():
+            self._postings.setdefault(term, {})[title] = count
+
+    def remove_document(self, title: str):
+        """Drop a movie from the index, a no-op if it isn't indexed."""
+        terms = self._doc_terms.pop(title, None)
+        if terms is None:
+            return
+        self._changed.add(title)
+        self._total_len -= self._doc_lens.pop(title)
+        for term in terms:
+            posting = self._postings[term]
+            del posting[title]
+            if not posting:
+                del self._postings[term]
+
+    def search(self, query: str, k=10):
+        """Return up to 'k' (title, BM25 score) pairs, best first."""
+        doc_count = len(self._doc_terms)
+        if not doc_count:
+            return []
+        avg_len = self._total_len / doc_count
+        scores = {}
+        for term in set(tokenize(query)):
+            posting = self._postings.get(term)
+            if not posting:
+                continue
+            idf = math.log(1 + (doc_count - len(posting) + 0.5)
+                           / (len(posting) + 0.5))
+            for title, count in posting.items():
+                norm = BM25_K1 * (1 - BM25_B + BM25_B
+                                  * self._doc_lens[title] / avg_len)
+                scores[title] = (scores.get(title, 0.0)
+                                 + idf * count * (BM25_K1 + 1)
+                                 / (count + norm))
+        best = heapq.nsmallest(k, scores.items(),
+                               key=lambda item: (-item[1], item[0]))
+        return best
+
+    def save(self, index_path: str):
+        """Persist the changes since the last save or load, along with the
+        fingerprint. Appends them to the log when this index was loaded from
+        'index_path' (or saved there), else writes a whole new snapshot."""
+        if (self._logged is None
+                or self._logged + len(self._changed)
+                > COMPACT_RATIO * max(1, len(self._doc_terms))):
+            self._save_snapshot(index_path)
+        else:
+            self._append_to_log(index_path)
+        self._changed.clear()
+
+    def _save_snapshot(self, index_path: str):
+        """Write the whole forward index atomically, then drop the log."""
+        tmp_path = index_path + TMP_SUFFIX
+        with open(tmp_path, "w") as fd:
+            json.dump({'fingerprint': self.fingerprint,
+                       'docs': self._doc_terms}, fd)
+        os.replace(tmp_path, index_path)
+        if os.path.exists(_log_path_for(index_path)):
+            os.remove(_log_path_for(index_path))
+        self._logged = 0
+
+    def _append_to_log(self, index_path: str):
+        """One line per save: the changed documents, None for removed ones.
+        A line cut short by a crash is ignored on load, and its fingerprint
+        with it, so the index then just gets rebuilt."""
+        docs = {title: self._doc_terms.get(title) for title in self._changed}
+        with open(_log_path_for(index_path), "a") as fd:
+            fd.write(json.dumps({'fingerprint': self.fingerprint,
+                                 'docs': docs}) + '\n')
+        self._logged += len(docs)
+
+    def _replay_log(self, log_path: str):
+        """Apply the saves logged since the snapshot, in order."""
+        if not os.path.exists(log_path):
+            return
+        with open(log_path, "r") as fd:
+            for line in fd:
+                try:
+                    entry = json.loads(line)
+                except ValueError:  # torn last line
+                    break
+                for title, terms in entry['docs'].items():
+                    self.remove_document(title)
+                    if terms is not None:
+                        self._add_terms(title, terms)
+                    self._logged += 1
+                self.fingerprint = entry['fingerprint']
+
+    @classmethod
+    def load(cls, index_path: str):
+        """Return the persisted index, snapshot plus log, or None if missing
+        or unreadable."""
+        try:
+            with open(index_path, "r") as fd:
+                raw = json.load(fd)
+            index = cls()
+            for title, terms in raw['docs'].items():
+                index._add_terms(title, terms)
+            index.fingerprint = raw['fingerprint']
+            index._logged = 0
+            index._replay_log(_log_path_for(index_path))
+        except (OSError, ValueError, KeyError, AttributeError):
+            return None
+        index._changed.clear()
+        return index
+
+    @classmethod
+    def build(cls, storage):
+        """Index every movie of 'storage' (any IStorage), streaming."""
+        index = cls()
+        index.fingerprint = db_fingerprint(storage.file_path)
+        for title, movie in storage.iter_movies():
+            index.set_document(title, movie.notes)
+        return index
+
@@ -87,40 +87,47 @@ def calc_ed(query: str, i: int, movie: str, j: int):
     not to 'return' right before it if the condition was met, but rather
     letting the eye fall down to a singular 'return edits'. Recursion == hard
     """
+    return _calc_ed_lowered(query.lower(), i, movie.lower(), j)
+
+
+def _calc_ed_lowered(query: str, i: int, movie: str, j: int):
+    """The recursion of calc_ed, on strings lowercased once up front rather
+    than again at every level of the recursion."""
     edits = 0
-    query = query.lower()
-    movie = movie.lower()
     if i == len(query) or j == len(movie):
         return RETAIN_ED  # base case 1, idx would go out of bounds
     if query[i] == movie[j]:
-        edits += calc_ed(query, i + 1, movie, j + 1)
+        edits += _calc_ed_lowered(query, i + 1, movie, j + 1)
     else:
         if i + 1 == len(query) or j + 1 == len(movie):
             return INCREASE_ED  # base case 2, idx + 1 would go out of bounds
         elif query[i] == movie[j + 1]:  # insertion candidate
             edits += 1
-            edits += calc_ed(query, i, movie, j + 1)
+            edits += _calc_ed_lowered(query, i, movie, j + 1)
         elif query[i + 1] == movie[j]:  # deletion candidate
             edits += 1
-            edits += calc_ed(query, i + 1, movie, j)
+            edits += _calc_ed_lowered(query, i + 1, movie, j)
         elif query[i + 1] == movie[j + 1]:  # substitution candidate
             edits += 1
-            edits += calc_ed(query, i + 1, movie, j + 1)
+            edits += _calc_ed_lowered(query, i + 1, movie, j + 1)
         else:  # move on to the next
             edits += 1
-            edits += calc_ed(query, i + 1, movie, j + 1)
+            edits += _calc_ed_lowered(query, i + 1, movie, j + 1)
     return edits
 
 
-def get_fuzzy_srch_candidates(query: str, movies: dict):
-    """Return list of dicts which have qualified as candidates"""
-    candidates = []
-    for k, v in movies.items():
-        mov_str_cp = k
-        if is_unlikely_match_at_zero_idx(query, k):
-            mov_str_cp = get_comparison_basis(query, k)
-        editing_distance = calc_ed(query, START_IDX, mov_str_cp, START_IDX)
-        if (CHUNK_SZ < len(query) <= len(mov_str_cp) * LEN_TOLERANCE_COEFF and
-                editing_distance < len(query) * ED_TOLERANCE_COEFF):
-            candidates.append({k: v})
-    return candidates
+def get_fuzzy_ed(query: str, movie: str):
+    """Return the editing distance between query and movie title if the
+    title qualifies as a fuzzy candidate, else None. Keeping the distance
+    (rather than a yes/no) lets callers rank the candidates."""
+    if len(query) <= CHUNK_SZ:  # designated too short to consider
+        return None
+    mov_str_cp = movie
+    if is_unlikely_match_at_zero_idx(query, movie):
+        mov_str_cp = get_comparison_basis(query, movie)
+    editing_distance = calc_ed(query, START_IDX, mov_str_cp, START_IDX)
+    if (len(query) <= len(mov_str_cp) * LEN_TOLERANCE_COEFF and
+            editing_distance < len(query) * ED_TOLERANCE_COEFF):
+        return editing_distance
+    return None
+
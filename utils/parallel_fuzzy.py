@@ -0,0 +1,91 @@
+"""Fuzzy matching spread over several CPU cores for large catalogs.
+
+get_fuzzy_ed() is pure Python and CPU-bound, so threads wouldn't help.
+ParallelFuzzyMatcher starts a few worker processes once and hands each a
+contiguous slice of the titles, which the worker lowercases and keeps for
+its whole life. A query then only costs sending the query string to every
+worker and receiving the (position, editing distance) pairs of the titles
+which qualified. Concatenating the slices' answers in slice order gives
+exactly the serial order, so the results don't depend on the worker count.
+Below PARALLEL_MIN_TITLES the process round trips outweigh the gain, so
+should_parallelize() says no and callers stay serial."""
+
+import os
+import signal
+import multiprocessing
+from utils.fuzzy_string_matching import get_fuzzy_ed
+
+PARALLEL_MIN_TITLES = 20000
+DEFAULT_WORKERS = os.cpu_count() or 1
+
+
+def should_parallelize(title_count: int, workers: int,
+                       min_titles=PARALLEL_MIN_TITLES):
+    """True if a DB of 'title_count' titles is worth a process pool."""
+    return workers > 1 and title_count >= min_titles
+
+
+def _lower_keeping_len(title: str):
+    """Fuzzy matching lowercases anyway, doing it once up front is only
+    safe if lowercasing doesn't change the length (it does for e.g. 'İ')."""
+    lowered = title.lower()
+    return lowered if len(lowered) == len(title) else title
+
+
+def _serve_partition(conn, titles: list):
+    """Worker process main loop: answer queries until sent None."""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # Ctrl+C is for the parent
+    titles = [_lower_keeping_len(title) for title in titles]
+    while True:
+        query = conn.recv()
+        if query is None:
+            break
+        qualified = []
+        for i, title in enumerate(titles):
+            editing_distance = get_fuzzy_ed(query, title)
+            if editing_distance is not None:
+                qualified.append((i, editing_distance))
+        conn.send(qualified)
+    conn.close()
+
+
+class ParallelFuzzyMatcher:
+    """A persistent pool of worker processes, each holding a slice of the
+    titles. Call close() when done, or let the daemon workers die along
+    with the main process."""
+    def __init__(self, titles, workers=DEFAULT_WORKERS):
+        self._titles = list(titles)
+        workers = max(1, min(workers, len(self._titles)))
+        slice_len = max(1, -(-len(self._titles) // workers))  # ceil div
+        self._workers = []  # (connection, process, offset of its slice)
+        for offset in range(0, len(self._titles), slice_len):
+            parent_conn, child_conn = multiprocessing.Pipe()
+            process = multiprocessing.Process(
+                target=_serve_partition,
+                args=(child_conn, self._titles[offset:offset + slice_len]),
+                daemon=True)
+            process.start()
+            child_conn.close()
+            self._workers.append((parent_conn, process, offset))
+
+    def fuzzy_eds(self, query: str):
+        """Return [(title, editing distance)] of the qualifying titles, in
+        the order the titles were given, same as the serial loop would."""
+        for conn, _, _ in self._workers:  # all workers start at once
+            conn.send(query)
+        results = []
+        for conn, _, offset in self._workers:
+            for i, editing_distance in conn.recv():
+                results.append((self._titles[offset + i], editing_distance))
+        return results
+
+    def close(self):
+        """Stop the workers and wait for them to exit."""
+        for conn, process, _ in self._workers:
+            try:
+                conn.send(None)
+            except OSError:  # worker already gone
+                pass
+            conn.close()
+            process.join()
+        self._workers = []
@@ -0,0 +1,342 @@
+"""A small query language for the movie DB, e.g.
+rating>=7.5 and year in 1990..1999 and title~"star"
+    order by rating desc limit 20
+
+Grammar (keywords are case-insensitive):
+query      := [expression] ["order by" field ["asc" | "desc"]] ["limit" int]
+expression := conjunct ("or" conjunct)*
+conjunct   := negation ("and" negation)*
+negation   := "not" negation | "(" expression ")" | condition
+condition  := field op value | field "in" number ".." number
+op         := >= | <= | > | < | = | != | ~   (~ : case-insensitive substring)
+field      := title | notes | year | rating
+
+A query is parsed once by compile_query() into a QueryPlan: the condition
+tree becomes nested closures, and the numeric bounds that every match has
+to satisfy (rating>=7.5 and year in 1990..1999 above) are pulled out of
+the top-level 'and's. Executed against an IndexedCollection, the plan
+walks a SortedIndex between those bounds, or in the 'order by' direction
+so that a 'limit' stops it early; against any other (title, Movie) stream,
+e.g. storage.iter_movies(), it is one scan with a bounded heap for the
+'order by ... limit'. A 'limit' without 'order by' keeps the first matches
+by title, so both access paths return the same rows."""
+
+import re
+import json
+import heapq
+import bisect
+import itertools
+
+NUMERIC_FIELDS = ('year', 'rating')
+TEXT_FIELDS = ('title', 'notes')
+END = (None, None)  # token kind and value past the last token
+KEYWORDS = ('and', 'or', 'not', 'in', 'order', 'by', 'asc', 'desc', 'limit')
+TOKEN_RE = re.compile(r"""\s*(?:
+    (?P<number>\d+(?:\.\d+)?)
+    |(?P<string>"(?:[^"\\]|\\.)*")
+    |(?P<op>>=|<=|!=|\.\.|[<>=~()])
+    |(?P<word>[A-Za-z_]+)
+)""", re.VERBOSE)
+_COMPARISONS = {
+    '>=': lambda a, b: a >= b,
+    '<=': lambda a, b: a <= b,
+    '>': lambda a, b: a > b,
+    '<': lambda a, b: a < b,
+    '=': lambda a, b: a == b,
+    '!=': lambda a, b: a != b,
+}
+
+
+def tokenize(text: str):
+    """Return a list of (kind, value) tokens, kind being one of 'number',
+    'string', 'op', 'word' or 'keyword'. Raises ValueError on junk."""
+    tokens = []
+    pos = 0
+    text = text.rstrip()
+    while pos < len(text):
+        match = TOKEN_RE.match(text, pos)
+        if not match:
+            raise ValueError(f"Can't make sense of '{text[pos:].strip()}'")
+        kind = match.lastgroup
+        value = match.group(kind)
+        if kind == 'number':
+            value = float(value) if '.' in value else int(value)
+        elif kind == 'string':
+            value = json.loads(value)
+        elif kind == 'word' and value.lower() in KEYWORDS:
+            kind, value = 'keyword', value.lower()
+        tokens.append((kind, value))
+        pos = match.end()
+    return tokens
+
+
+class _Parser:
+    """Recursive descent over the tokens, building tuples as tree nodes:
+    ('or', [nodes]), ('and', [nodes]), ('not', node), ('cmp', field, op,
+    value) and ('true',) for an empty condition."""
+    def __init__(self, tokens: list):
+        self._tokens = tokens
+        self._pos = 0
+
+    def _peek(self):
+        if self._pos < len(self._tokens):
+            return self._tokens[self._pos]
+        return END
+
+    def _accept(self, kind: str, value=None):
+        """Consume and return the next token's value if it fits, else None."""
+        next_kind, next_value = self._peek()
+        if next_kind == kind and (value is None or next_value == value):
+            self._pos += 1
+            return next_value
+        return None
+
+    def _expect(self, kind: str, what: str, value=None):
+        found = self._accept(kind, value)
+        if found is None:
+            raise ValueError(f"Expected {what}, found "
+                             f"{self._peek()[1] or 'end of query'!r}")
+        return found
+
+    def parse(self):
+        """Return (condition tree, order field, descending, limit)."""
+        node = ('true',)
+        if self._peek() not in (END, ('keyword', 'order'),
+                                ('keyword', 'limit')):
+            node = self._expression()
+        order_field, descending, limit = None, False, None
+        if self._accept('keyword', 'order'):
+            self._expect('keyword', "'by'", 'by')
+            order_field = self._field()
+            descending = self._accept('keyword', 'desc') is not None
+            if not descending:
+                self._accept('keyword', 'asc')
+        if self._accept('keyword', 'limit'):
+            limit = self._expect('number', 'a number after limit')
+            if not isinstance(limit, int):
+                raise ValueError("limit must be a whole number")
+        if self._peek() != END:
+            raise ValueError(f"Unexpected {self._peek()[1]!r}")
+        return node, order_field, descending, limit
+
+    def _expression(self):
+        nodes = [self._conjunct()]
+        while self._accept('keyword', 'or'):
+            nodes.append(self._conjunct())
+        return nodes[0] if len(nodes) == 1 else ('or', nodes)
+
+    def _conjunct(self):
+        nodes = [self._negation()]
+        while self._accept('keyword', 'and'):
+            nodes.append(self._negation())
+        return nodes[0] if len(nodes) == 1 else ('and', nodes)
+
+    def _negation(self):
+        if self._accept('keyword', 'not'):
+            return 'not', self._negation()
+        if self._accept('op', '('):
+            node = self._expression()
+            self._expect('op', "')'", ')')
+            return node
+        return self._condition()
+
+    def _field(self):
+        field = self._expect('word', 'a field name')
+        if field.lower() not in NUMERIC_FIELDS + TEXT_FIELDS:
+            raise ValueError(f"Unknown field {field!r}, must be one of "
+                             f"{', '.join(TEXT_FIELDS + NUMERIC_FIELDS)}")
+        return field.lower()
+
+    def _condition(self):
+        field = self._field()
+        if self._accept('keyword', 'in'):
+            low = self._expect('number', 'a number')
+            self._expect('op', "'..'", '..')
+            high = self._expect('number', 'a number')
+            self._check_numeric(field, 'in')
+            return 'and', [('cmp', field, '>=', low),
+                           ('cmp', field, '<=', high)]
+        op = self._expect('op', 'a comparison operator')
+        if op not in _COMPARISONS and op != '~':
+            raise ValueError(f"{op!r} is not a comparison operator")
+        if field in NUMERIC_FIELDS:
+            self._check_numeric(field, op)
+            value = self._expect('number', f"a number to compare {field}")
+        else:
+            value = self._expect('string', f"a \"quoted\" {field}")
+        return 'cmp', field, op, value
+
+    @staticmethod
+    def _check_numeric(field: str, op: str):
+        if field not in NUMERIC_FIELDS:
+            raise ValueError(f"'{op}' needs a number field, not {field}")
+        if op == '~':
+            raise ValueError(f"'~' needs a text field, not {field}")
+
+
+def _compile(node: tuple):
+    """Turn a condition tree into a predicate(title, movie) closure."""
+    kind = node[0]
+    if kind == 'true':
+        return lambda title, movie: True
+    if kind == 'not':
+        inner = _compile(node[1])
+        return lambda title, movie: not inner(title, movie)
+    if kind in ('and', 'or'):
+        parts = [_compile(child) for child in node[1]]
+        combine = all if kind == 'and' else any
+        return lambda title, movie: combine(part(title, movie)
+                                            for part in parts)
+    _, field, op, value = node
+    if field == 'title':
+        def get(title, movie):
+            return title
+    else:
+        def get(title, movie):
+            return getattr(movie, field)
+    if op == '~':
+        needle = value.lower()
+        return lambda title, movie: needle in get(title, movie).lower()
+    compare = _COMPARISONS[op]
+    return lambda title, movie: compare(get(title, movie), value)
+
+
+def _numeric_bounds(node: tuple):
+    """Return {field: (low, high)} that must hold for every match, read off
+    the conditions joined by top-level 'and's. Strict comparisons widen to
+    inclusive bounds, the predicate still filters the edges exactly."""
+    conditions = node[1] if node[0] == 'and' else [node]
+    bounds = {}
+    for cond in conditions:
+        if cond[0] == 'and':  # from 'in', or parenthesized
+            for field, (low, high) in _numeric_bounds(cond).items():
+                bounds[field] = _narrow(bounds.get(field), low, high)
+            continue
+        if cond[0] != 'cmp' or cond[1] not in NUMERIC_FIELDS:
+            continue
+        _, field, op, value = cond
+        low = value if op in ('>=', '>', '=') else None
+        high = value if op in ('<=', '<', '=') else None
+        if low is not None or high is not None:
+            bounds[field] = _narrow(bounds.get(field), low, high)
+    return bounds
+
+
+def _narrow(bound, low, high):
+    if bound is None:
+        return low, high
+    old_low, old_high = bound
+    if old_low is not None and (low is None or old_low > low):
+        low = old_low
+    if old_high is not None and (high is None or old_high < high):
+        high = old_high
+    return low, high
+
+
+class SortedIndex:
+    """Titles sorted by (value of 'field', title), searchable with bisect."""
+    def __init__(self, movies, field: str):
+        entries = sorted((getattr(movie, field), title)
+                         for title, movie in movies.items())
+        self._keys = [value for value, _ in entries]
+        self._titles = [title for _, title in entries]
+
+    def span(self, low=None, high=None):
+        """Return the [start, stop) positions of low <= value <= high."""
+        start = 0 if low is None else bisect.bisect_left(self._keys, low)
+        stop = (len(self._keys) if high is None
+                else bisect.bisect_right(self._keys, high))
+        return start, max(start, stop)
+
+    def titles(self, low=None, high=None, descending=False):
+        """Yield titles with low <= value <= high, in index order."""
+        start, stop = self.span(low, high)
+        positions = range(start, stop)
+        if descending:
+            positions = reversed(positions)
+        for i in positions:
+            yield self._titles[i]
+
+
+class IndexedCollection:
+    """A MovieCollection plus SortedIndexes over its numeric fields, built
+    on first use. Worth keeping around while the DB doesn't change."""
+    def __init__(self, movies):
+        self.movies = movies
+        self._indexes = {}
+
+    def sorted_index(self, field: str):
+        if field not in self._indexes:
+            self._indexes[field] = SortedIndex(self.movies, field)
+        return self._indexes[field]
+
+
+class QueryPlan:
+    """A compiled query. execute() picks the access path per source."""
+    def __init__(self, predicate, bounds: dict, order_field, descending,
+                 limit):
+        self.predicate = predicate
+        self.bounds = bounds
+        self.order_field = order_field
+        self.descending = descending
+        self.limit = limit
+
+    def _sort_key(self, pair: tuple):
+        title, movie = pair
+        if self.order_field in (None, 'title'):
+            return title
+        return getattr(movie, self.order_field), title
+
+    def execute(self, source):
+        """Return the matching (title, Movie) pairs as a list. 'source' is
+        an IndexedCollection or any iterable of (title, Movie) pairs."""
+        if isinstance(source, IndexedCollection):
+            return self._execute_indexed(source)
+        return self._finish(pair for pair in source
+                            if self.predicate(*pair))
+
+    def _finish(self, matches, ordered=False):
+        """Apply 'order by' and 'limit' to an iterable of matches. Without
+        'order by', a 'limit' still picks by title rather than by the order
+        the access path happens to produce."""
+        if ordered or (self.order_field is None and self.limit is None):
+            return list(itertools.islice(matches, self.limit))
+        if self.limit is None:
+            return sorted(matches, key=self._sort_key,
+                          reverse=self.descending)
+        pick = heapq.nlargest if self.descending else heapq.nsmallest
+        return pick(self.limit, matches, key=self._sort_key)
+
+    def _execute_indexed(self, source: IndexedCollection):
+        """Index pushdown. Walk the index of the 'order by' field when it
+        has one (then 'limit' ends the walk early), else the index of the
+        most selective bounded field, else scan the whole collection."""
+        movies = source.movies
+        if self.order_field in NUMERIC_FIELDS:
+            field = self.order_field
+        else:
+            field = self._most_selective_field(source)
+        if field is None:
+            return self._finish(pair for pair in movies.items()
+                                if self.predicate(*pair))
+        low, high = self.bounds.get(field, (None, None))
+        titles = source.sorted_index(field).titles(
+            low, high, self.descending and field == self.order_field)
+        matches = ((title, movies[title]) for title in titles
+                   if self.predicate(title, movies[title]))
+        return self._finish(matches, ordered=field == self.order_field)
+
+    def _most_selective_field(self, source: IndexedCollection):
+        best_field, best_count = None, None
+        for field, (low, high) in self.bounds.items():
+            start, stop = source.sorted_index(field).span(low, high)
+            if best_count is None or stop - start < best_count:
+                best_field, best_count = field, stop - start
+        return best_field
+
+
+def compile_query(text: str):
+    """Parse 'text' once into a reusable QueryPlan, or raise ValueError."""
+    node, order_field, descending, limit = _Parser(tokenize(text)).parse()
+    return QueryPlan(_compile(node), _numeric_bounds(node), order_field,
+                     descending, limit)
@@ -0,0 +1,80 @@
+"""Ranked title search. Exact, prefix, word and fuzzy matches are scored on
+one scale and only the best 'k' are kept, in a bounded heap, so a vague
+query against a huge DB never materializes thousands of weak candidates.
+
+Score bands (higher is better, bands never overlap):
+exact title          4.0
+title prefix         3.0 - 4.0   (longer share of the title scores higher)
+whole/partial word   2.0 - 3.0   (same MATCH_COEFFICIENT rule as before)
+fuzzy (typos)        0.5 - 1.0   (1 - editing distance / len(query))
+"""
+
+import heapq
+from utils.fuzzy_string_matching import get_fuzzy_ed
+
+MATCH_COEFFICIENT = 0.7
+PREFIX_MIN_LEN = 3
+DEFAULT_TOP_K = 10
+SCORE_EXACT = 4.0
+SCORE_PREFIX = 3.0
+SCORE_WORD = 2.0
+SCORE_FUZZY = 1.0
+
+
+def score_title(query: str, title: str, fuzzy_eds=None):
+    """Return the score of 'title' for 'query', or None if no match at all.
+    Expects 'query' lowercased and stripped. Cheaper checks go first, fuzzy
+    matching only runs for titles that didn't match any other way, unless
+    'fuzzy_eds' ({title: editing distance}) already has the answers."""
+    title_lower = title.lower()
+    if query == title_lower:
+        return SCORE_EXACT
+    if len(query) >= PREFIX_MIN_LEN and title_lower.startswith(query):
+        return SCORE_PREFIX + len(query) / len(title_lower)
+    best_word_score = None
+    for word in title_lower.split():
+        if query in word and len(query) > len(word) * MATCH_COEFFICIENT:
+            word_score = SCORE_WORD + len(query) / len(word)
+            if best_word_score is None or word_score > best_word_score:
+                best_word_score = word_score
+    if best_word_score is not None:
+        return best_word_score
+    if fuzzy_eds is None:
+        editing_distance = get_fuzzy_ed(query, title)
+    else:
+        editing_distance = fuzzy_eds.get(title)
+    if editing_distance is None:
+        return None
+    return SCORE_FUZZY - editing_distance / len(query)
+
+
+def get_ranked_candidates(query: str, titles, k=DEFAULT_TOP_K,
+                          fuzzy_matcher=None):
+    """Return up to 'k' (title, score) pairs, best first. Ties keep DB order.
+    'titles' may be any iterable of titles, e.g. a MovieCollection. Stops
+    scanning as soon as 'k' exact hits are in, nothing can outrank them.
+    A ParallelFuzzyMatcher holding the same titles may do the fuzzy part
+    up front on all cores, the result is the same as without it."""
+    query = query.strip().lower()
+    if not query or k <= 0:
+        return []
+    fuzzy_eds = None
+    if fuzzy_matcher is not None:
+        fuzzy_eds = dict(fuzzy_matcher.fuzzy_eds(query))
+    heap = []  # min-heap of (score, -position, title), size <= k
+    exact_hits = 0
+    for position, title in enumerate(titles):
+        score = score_title(query, title, fuzzy_eds)
+        if score is None:
+            continue
+        entry = (score, -position, title)
+        if len(heap) < k:
+            heapq.heappush(heap, entry)
+        elif entry > heap[0]:
+            heapq.heapreplace(heap, entry)
+        if score == SCORE_EXACT:
+            exact_hits += 1
+            if exact_hits >= k:
+                break
+    ranked = sorted(heap, reverse=True)
+    return [(title, score) for score, _, title in ranked]
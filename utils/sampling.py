@@ -0,0 +1,89 @@
+"""Random movie picks for the 'Random movie' command. MovieSampler keeps
+the titles in an indexed list, and is worth keeping around while the DB
+doesn't change, so a uniform pick is a single randrange()
+instead of walking the dict up to a random position. Rating-weighted picks
+go through an alias table (Vose's method): built once in O(n), after which
+each pick costs two random numbers regardless of the DB size. When movies
+come from a stream rather than from a collection, reservoir_sample() picks
+uniformly in a single pass without holding the stream in memory."""
+
+import random
+
+
+def build_alias_table(weights: list):
+    """Return (probabilities, aliases) for Vose's alias method. Column i is
+    kept with probability probabilities[i], else its alias is taken."""
+    count = len(weights)
+    total = sum(weights)
+    scaled = [weight * count / total for weight in weights]
+    probabilities = [1.0] * count
+    aliases = list(range(count))
+    small = [i for i, weight in enumerate(scaled) if weight < 1.0]
+    large = [i for i, weight in enumerate(scaled) if weight >= 1.0]
+    while small and large:
+        less, more = small.pop(), large.pop()
+        probabilities[less] = scaled[less]
+        aliases[less] = more
+        scaled[more] -= 1.0 - scaled[less]
+        if scaled[more] < 1.0:
+            small.append(more)
+        else:
+            large.append(more)
+    # leftovers are 1.0 up to float rounding, their defaults already fit
+    return probabilities, aliases
+
+
+def reservoir_sample(records, k=1, rng=random):
+    """Return up to 'k' distinct items picked uniformly from any iterable,
+    e.g. storage.iter_movies(), in one pass and O(k) memory."""
+    reservoir = []
+    for i, record in enumerate(records):
+        if i < k:
+            reservoir.append(record)
+            continue
+        j = rng.randrange(i + 1)
+        if j < k:
+            reservoir[j] = record
+    return reservoir
+
+
+class MovieSampler:
+    """Random picks out of a MovieCollection. Every pick returns a title
+    (None where nothing qualifies); the Movie is movies[title]."""
+    def __init__(self, movies, rng=random):
+        self.movies = movies
+        self._titles = list(movies)
+        self._rng = rng
+        self._alias_table = None  # built on the first weighted pick
+
+    def pick(self):
+        """Uniform pick, O(1)."""
+        if not self._titles:
+            return None
+        return self._titles[self._rng.randrange(len(self._titles))]
+
+    def pick_weighted(self):
+        """Pick with probability proportional to the rating, O(1) after the
+        table is built. If all movies are rated 0, falls back to uniform."""
+        if self._alias_table is None:
+            weights = [self.movies[title].rating for title in self._titles]
+            if not any(weights):
+                return self.pick()
+            self._alias_table = build_alias_table(weights)
+        probabilities, aliases = self._alias_table
+        column = self._rng.randrange(len(self._titles))
+        if self._rng.random() < probabilities[column]:
+            return self._titles[column]
+        return self._titles[aliases[column]]
+
+    def pick_filtered(self, predicate):
+        """Uniform pick among the movies for which predicate(movie) holds.
+        One pass over the DB, holding only the count of matches so far."""
+        picked = reservoir_sample(
+            (title for title in self._titles
+             if predicate(self.movies[title])), 1, self._rng)
+        return picked[0] if picked else None
+
+    def sample(self, count: int):
+        """Up to 'count' distinct titles, no repeats."""
+        return self._rng.sample(self._titles, min(count, len(self._titles)))